@@ -0,0 +1,190 @@
+"""Benchmark all six app variants against the stub Ollama server.
+
+Each app runs headlessly under Streamlit's AppTest. For every app we record
+the cold first run, rerun render time as the history grows, and one chat
+turn (end-to-end latency plus time-to-first-token where the app streams).
+The chat store is benchmarked separately: save and load cost for the old
+shelve against the append-only log, from 10 to 10k messages.
+
+Results are written as JSON so runs from different commits can be diffed:
+
+    python -m bench.run --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shelve
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from bench import stub_ollama  # noqa: E402
+
+# App -> (session_state key holding the history, message text key, how to submit)
+APPS = {
+    "calmconnect.py": ("conversation_history", "content", "form"),
+    "theOG.py": ("conversation_history", "content", "text_input"),
+    "master.py": ("messages", "text", "chat_input"),
+    "reborn.py": ("messages", "text", "chat_input"),
+    "thejuju.py": ("messages", "text", "chat_input"),
+    "alternative.py": ("messages", "text", "chat_input"),
+}
+HISTORY_SIZES = (10, 100, 1000, 10000)
+TURN_MESSAGE = "I can't sleep and my mind keeps racing."
+
+
+def fake_history(n, text_key):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", text_key: f"Message number {i} about how the day went."}
+        for i in range(n)
+    ]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return round(time.perf_counter() - started, 4)
+
+
+def submit(at, how, message, history_key="messages", timeout=120.0):
+    if how == "chat_input":
+        # Replies stream on a background worker; rerun until it is in the history
+        expected = len(at.session_state[history_key]) + 2
+        at.chat_input[0].set_value(message)
+        at.run()
+        deadline = time.monotonic() + timeout
+        while len(at.session_state[history_key]) < expected and time.monotonic() < deadline:
+            time.sleep(0.01)
+            at.run()
+    elif how == "form":
+        at.text_input(key="input_box").set_value(message)
+        next(b for b in at.button if b.label == "Send").click()
+        at.run()
+    else:
+        at.text_input(key="user_input").set_value(message)
+        at.run()
+
+
+def bench_app(name, sizes, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    history_key, text_key, how = APPS[name]
+    result = {}
+    workdir = tempfile.mkdtemp(prefix="nia-bench-")
+    cwd = os.getcwd()
+    try:
+        # Apps read and write relative paths; keep that out of the repo
+        shutil.copy(os.path.join(APP_DIR, "background.png"), workdir)
+        os.chdir(workdir)
+        at = AppTest.from_file(os.path.join(APP_DIR, name), default_timeout=timeout)
+        result["cold_run"] = timed(at.run)
+        if at.exception:
+            result["error"] = at.exception[0].message
+            return result
+        # Markup re-sent on every rerun (inline CSS, background images, ...)
+        result["markdown_bytes"] = sum(len(m.value.encode("utf-8")) for m in at.markdown)
+
+        result["rerun"] = {}
+        for n in sizes:
+            at.session_state[history_key] = fake_history(n, text_key)
+            at.run()  # Let per-history caches warm up
+            result["rerun"][str(n)] = timed(at.run)
+
+        at.session_state[history_key] = fake_history(10, text_key)
+        at.run()
+        result["turn"] = timed(lambda: submit(at, how, message=TURN_MESSAGE, history_key=history_key, timeout=timeout))
+        if "turn_stats" in at.session_state and at.session_state["turn_stats"]:
+            result["turn_stats"] = at.session_state["turn_stats"][-1]
+        if at.exception:
+            result["error"] = at.exception[0].message
+    except Exception:
+        result["error"] = traceback.format_exc(limit=3)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def bench_memory(sizes):
+    from nia.memory import ChatLog
+
+    results = {}
+    for n in sizes:
+        workdir = tempfile.mkdtemp(prefix="nia-bench-")
+        try:
+            messages = fake_history(n, "text")
+            new = messages + [{"role": "user", "text": TURN_MESSAGE}]
+
+            legacy = os.path.join(workdir, "chat_memory")
+            with shelve.open(legacy) as db:
+                db["messages"] = messages
+
+            def legacy_save():
+                with shelve.open(legacy) as db:
+                    db["messages"] = new
+
+            def legacy_load():
+                with shelve.open(legacy) as db:
+                    db.get("messages", [])
+
+            log = ChatLog(os.path.join(workdir, "log"))
+            stored = log.sync(messages, 0)
+            results[str(n)] = {
+                "shelve_save": timed(legacy_save),
+                "shelve_load": timed(legacy_load),
+                "log_save": timed(lambda: log.sync(new, stored)),
+                "log_load": timed(lambda: ChatLog(log.path).load()),
+            }
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=APP_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Nia app variants.")
+    parser.add_argument("--apps", nargs="*", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--sizes", nargs="*", type=int, default=list(HISTORY_SIZES))
+    parser.add_argument("--ttft", type=float, default=0.1, help="stub seconds before the first token")
+    parser.add_argument("--tps", type=float, default=50.0, help="stub tokens per second")
+    parser.add_argument("--tokens", type=int, default=60, help="stub tokens per reply")
+    parser.add_argument("--timeout", type=float, default=120.0, help="AppTest timeout per run")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    server, config = stub_ollama.start(ttft=args.ttft, tps=args.tps, tokens=args.tokens)
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{server.server_port}"
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "stub": {"ttft": args.ttft, "tps": args.tps, "tokens": args.tokens},
+        "apps": {name: bench_app(name, args.sizes, args.timeout) for name in args.apps},
+        "memory": bench_memory(args.sizes),
+    }
+    report["stub"]["requests"] = config.requests
+    server.shutdown()
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Startup benchmark: cold start and rerun cost of each app with voice off.
+
+Every app runs in a fresh interpreter so import costs are counted. Besides
+the timings, the report lists which voice backends ended up imported (none
+should be while voice is off) and what each backend costs to import on its
+own, which is what lazy loading saves.
+
+    python -m bench.startup --output startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from bench import stub_ollama  # noqa: E402
+from bench.run import APPS, git_commit  # noqa: E402
+
+VOICE_MODULES = ("pygame", "pyttsx3", "speech_recognition", "elevenlabs")
+
+APP_SCRIPT = """
+import json, shutil, sys, time
+sys.path.insert(0, {app_dir!r})
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+shutil.copy({background!r}, ".")
+at = AppTest.from_file({path!r}, default_timeout=120)
+at.run()
+first = time.perf_counter()
+at.run()
+rerun = time.perf_counter()
+print(json.dumps({{
+    "streamlit_import": round(imported - started, 4),
+    "first_run": round(first - imported, 4),
+    "rerun": round(rerun - first, 4),
+    "voice_modules_loaded": [m for m in {voice!r} if m in sys.modules],
+    "error": at.exception[0].message if at.exception else None,
+}}))
+"""
+
+IMPORT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+try:
+    import {module}
+    print(json.dumps(round(time.perf_counter() - started, 4)))
+except Exception as e:
+    print(json.dumps(None))
+"""
+
+
+def run_python(code, cwd=None):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=cwd, env=os.environ)
+    try:
+        return json.loads(out.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "no output"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app startup with voice off.")
+    parser.add_argument("--apps", nargs="*", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    server, _ = stub_ollama.start(ttft=0.0, tps=1000.0)
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{server.server_port}"
+
+    apps = {}
+    for name in args.apps:
+        with tempfile.TemporaryDirectory(prefix="nia-startup-") as workdir:
+            apps[name] = run_python(APP_SCRIPT.format(
+                app_dir=APP_DIR,
+                path=os.path.join(APP_DIR, name),
+                background=os.path.join(APP_DIR, "background.png"),
+                voice=VOICE_MODULES,
+            ), cwd=workdir)
+    report = {
+        "commit": git_commit(),
+        "apps": apps,
+        "voice_import_cost": {m: run_python(IMPORT_SCRIPT.format(module=m)) for m in VOICE_MODULES},
+    }
+    server.shutdown()
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Local stand-in for the Ollama HTTP API.
+
+Streams canned tokens at a configurable rate so the apps can be benchmarked
+without a GPU or a real model. Supports the endpoints the apps use: chat,
+generate, embed/embeddings, ps and tags.
+
+    python -m bench.stub_ollama --port 11435 --tps 50 --ttft 0.2
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("I hear you, and it makes sense to feel that way. Take a slow breath with me. "
+         "You are doing better than you think, one small step at a time. ").split()
+
+
+class StubConfig:
+    def __init__(self, ttft=0.1, tps=50.0, tokens=60, dims=64, model="mistral:latest"):
+        self.ttft = ttft  # Seconds before the first token
+        self.tps = tps  # Tokens per second after that
+        self.tokens = tokens  # Tokens per reply
+        self.dims = dims  # Embedding size
+        self.model = model
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def embed(text, dims):
+    """Deterministic fake embedding; similar strings do not get similar vectors."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(dims)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real server
+    config = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/ps":
+            self._send_json({"models": [{"name": self.config.model, "model": self.config.model}]})
+        elif self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.config.model, "model": self.config.model}]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.config.lock:
+            self.config.requests += 1
+        if self.path in ("/api/chat", "/api/generate"):
+            self._generate(request, chat=self.path == "/api/chat")
+        elif self.path == "/api/embed":
+            inputs = request.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self._send_json({"model": request.get("model"), "embeddings": [embed(t, self.config.dims) for t in inputs]})
+        elif self.path == "/api/embeddings":
+            self._send_json({"embedding": embed(request.get("prompt", ""), self.config.dims)})
+        else:
+            self.send_error(404)
+
+    def _chunk(self, request, text, chat, done, **extra):
+        body = {"model": request.get("model"), "created_at": "2024-01-01T00:00:00Z", "done": done, **extra}
+        if chat:
+            body["message"] = {"role": "assistant", "content": text}
+        else:
+            body["response"] = text
+        return body
+
+    def _generate(self, request, chat):
+        config = self.config
+        # An empty generate request only loads the model
+        tokens = 0 if not chat and not request.get("prompt") else config.tokens
+        pieces = [WORDS[i % len(WORDS)] + " " for i in range(tokens)]
+        stats = {"eval_count": tokens, "prompt_eval_count": 1, "total_duration": 0, "eval_duration": 0}
+        if not request.get("stream", True):
+            time.sleep(config.ttft + tokens / config.tps if tokens else 0)
+            self._send_json(self._chunk(request, "".join(pieces), chat, True, done_reason="stop", **stats))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            if tokens:
+                time.sleep(config.ttft)
+            for piece in pieces:
+                self._write_chunk(self._chunk(request, piece, chat, False))
+                time.sleep(1 / config.tps)
+            self._write_chunk(self._chunk(request, "", chat, True, done_reason="stop", **stats))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client closed the stream early
+
+    def _write_chunk(self, body):
+        data = json.dumps(body).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start(port=0, **kwargs):
+    """Start the stub on a background thread; returns (server, config)."""
+    config = StubConfig(**kwargs)
+    handler = type("ConfiguredHandler", (Handler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft", type=float, default=0.1)
+    parser.add_argument("--tps", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=60)
+    args = parser.parse_args()
+    server, _ = start(args.port, ttft=args.ttft, tps=args.tps, tokens=args.tokens)
+    print(f"Stub Ollama listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 import streamlit as st
-import ollama
-import logging
+from nia.assets import apply_style
+from nia.pool import get_response_pool
+from nia.render import debug_panel, render_history, warmup_notice
+from nia.session import generate_response
+from nia.tracing import start_turn
+from nia.warmup import ensure_warm
 
 # Set page configuration
 st.set_page_config(page_title="Emotional Support Agent", page_icon="🧠", layout="wide")
@@ -8,31 +12,18 @@ st.set_page_config(page_title="Emotional Support Agent", page_icon="🧠", layou
 # Initialize session state
 if "conversation_history" not in st.session_state:
     st.session_state.conversation_history = []
-if "is_processing" not in st.session_state:
-    st.session_state.is_processing = False  # Flag to check if we are processing input
 
 # Model to use
 MODEL_NAME = "mistral:latest"
 
-# Function to generate AI responses
-def generate_response(user_input):
-    """Generate AI response and update conversation history."""
-    st.session_state.conversation_history.append({"role": "user", "content": user_input})
-
-    try:
-        response = ollama.chat(model=MODEL_NAME, messages=st.session_state.conversation_history)
-        ai_response = response['message']['content']
-    except Exception as e:
-        ai_response = "I'm sorry, but I couldn't process your request. Please try again."
-        st.error("An error occurred while generating the response.")
-        logging.error(f"Error generating response: {e}")
-
-    st.session_state.conversation_history.append({"role": "assistant", "content": ai_response})
-    return ai_response
+# Fixed prompts behind the feature buttons, served from a pre-generated pool
+AFFIRMATION_PROMPT = "Give me a positive affirmation."
+MEDITATION_PROMPT = "Give me a guided meditation."
+response_pool = get_response_pool(MODEL_NAME)
+response_pool.warm(AFFIRMATION_PROMPT, MEDITATION_PROMPT)
 
 # Styling for a clean, blue input field design
-st.markdown("""
-    <style>
+apply_style("""
     body {
         font-family: 'Roboto', sans-serif;
         background: linear-gradient(135deg, #1e2a47, #667eea);
@@ -126,20 +117,26 @@ st.markdown("""
     .input-box button:active {
         background-color: #4d54e7;
     }
-    </style>
-""", unsafe_allow_html=True)
+""")
 
 # Title
 st.title("🧠 AI Emotional Support")
 
+# Load the model once per process and keep it pinned
+model_warmer = ensure_warm(MODEL_NAME)
+warmup_notice(model_warmer)
+debug_panel()
+
 # Display chat history with sleek modern design
+def render_message(msg):
+    with st.chat_message(msg["role"]):
+        message_class = "user-message" if msg["role"] == "user" else "assistant-message"
+        st.markdown(f"<div class='{message_class}'>{msg['content']}</div>", unsafe_allow_html=True)
+
 with st.container():
     st.markdown("<div class='card'>", unsafe_allow_html=True)
     st.markdown("<div class='chat-message-box'>", unsafe_allow_html=True)
-    for msg in st.session_state['conversation_history']:
-        with st.chat_message(msg["role"]):
-            message_class = "user-message" if msg["role"] == "user" else "assistant-message"
-            st.markdown(f"<div class='{message_class}'>{msg['content']}</div>", unsafe_allow_html=True)
+    render_history(st.session_state['conversation_history'], render_message)
     st.markdown("</div></div>", unsafe_allow_html=True)
 
 # User input section with modern design
@@ -151,36 +148,28 @@ with st.form("chat_form"):
     st.markdown("</div>", unsafe_allow_html=True)
 
 if submit_button and user_message:
-    # Prevent repeated responses
-    if not st.session_state.is_processing:
-        st.session_state.is_processing = True  # Set processing flag to True
+    # Generate AI response; a double-clicked Send gets the reply to the first click
+    turn = start_turn("calmconnect")  # Traces every stage of this turn
+    ai_response = generate_response(MODEL_NAME, user_message)
+    turn.finish()
 
-        # Generate AI response
-        ai_response = generate_response(user_message)
+    # Display AI response
+    with st.chat_message("assistant"):
+        st.markdown(f"<div class='assistant-message'>{ai_response}</div>", unsafe_allow_html=True)
 
-        # Display AI response
-        with st.chat_message("assistant"):
-            st.markdown(f"<div class='assistant-message'>{ai_response}</div>", unsafe_allow_html=True)
-
-        # Reset processing flag after response
-        st.session_state.is_processing = False  # Reset processing flag after response
-
-        # Optional: Use rerun to refresh the UI after input reset
-        st.rerun()  # Trigger a page rerun to clear the input field
+    # Optional: Use rerun to refresh the UI after input reset
+    st.rerun()  # Trigger a page rerun to clear the input field
 
 # Interactive Features: Affirmation and Meditation
-with st.container():
-    st.markdown("<div class='card'>", unsafe_allow_html=True)
-    with st.expander("💬 Need Encouragement?"):
-        if st.button("Give me a Positive Affirmation"):
-            affirmation = ollama.chat(model=MODEL_NAME, messages=[{"role": "user", "content": "Give me a positive affirmation."}])
-            st.markdown(f"**AI**: {affirmation['message']['content']}")
-    st.markdown("</div>", unsafe_allow_html=True)
-
-with st.container():
-    st.markdown("<div class='card'>", unsafe_allow_html=True)
-    with st.expander("🧘 Try a Relaxing Meditation:"):
-        if st.button("Give me a Guided Meditation"):
-            meditation = ollama.chat(model=MODEL_NAME, messages=[{"role": "user", "content": "Give me a guided meditation."}])
-            st.markdown(f"**AI**: {meditation['message']['content']}")
-    st.markdown("</div>", unsafe_allow_html=True)
+@st.fragment
+def feature_card(title, label, prompt):
+    # A click redraws just this card, not the chat history
+    with st.container():
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        with st.expander(title):
+            if st.button(label):
+                st.markdown(f"**AI**: {response_pool.take(prompt)}")
+        st.markdown("</div>", unsafe_allow_html=True)
+
+feature_card("💬 Need Encouragement?", "Give me a Positive Affirmation", AFFIRMATION_PROMPT)
+feature_card("🧘 Try a Relaxing Meditation:", "Give me a Guided Meditation", MEDITATION_PROMPT)
@@ -1,32 +1,16 @@
 import streamlit as st
-import ollama
-import time
-import shelve
-import os
-import pygame  # For playing audio
-from elevenlabs import set_api_key, Voice, VoiceSettings, generate
-
-# Initialize pygame mixer
-pygame.mixer.init()
-
-# Set ElevenLabs API Key
-set_api_key("YOUR_ELEVENLABS_API_KEY")  # Replace with your actual API key
-
-# Load or initialize chat memory
-def load_memory():
-    try:
-        with shelve.open("chat_memory") as db:
-            return db.get("messages", [])
-    except Exception as e:
-        st.error(f"Error loading chat memory: {e}")
-        return []
-
-def save_memory():
-    try:
-        with shelve.open("chat_memory") as db:
-            db["messages"] = st.session_state.messages
-    except Exception as e:
-        st.error(f"Error saving chat memory: {e}")
+from nia.assets import apply_style
+from nia.render import debug_panel, render_history, warmup_notice
+from nia.session import load_memory, save_memory, settle_reply, show_reply, start_reply
+from nia.tracing import start_turn
+from nia.voice import show_speech_error, start_elevenlabs_speech
+from nia.warmup import ensure_warm
+
+# ElevenLabs API Key, only used once voice is enabled
+ELEVENLABS_API_KEY = "YOUR_ELEVENLABS_API_KEY"  # Replace with your actual API key
+
+MODEL_NAME = "mistral:latest"
+SYSTEM_PROMPT = "You are Nia, an AI companion who provides emotional support. Your tone should be warm, casual, and human-like. Keep responses short but meaningful."
 
 # Initialize session state
 if 'messages' not in st.session_state:
@@ -35,15 +19,21 @@ if 'voice_enabled' not in st.session_state:
     st.session_state.voice_enabled = False  # Default: Voice OFF
 if 'voice_gender' not in st.session_state:
     st.session_state.voice_gender = "Female"  # Default voice
+if 'typing_effect' not in st.session_state:
+    st.session_state.typing_effect = False  # Cosmetic only, never delays the first token
 
 # Streamlit app configuration
 st.set_page_config(page_title="Your AI Companion", layout="centered")
 st.title("Chat with Me")
 st.write("Your AI companion who truly cares.")
 
+# Load the model once per process and keep it pinned
+model_warmer = ensure_warm(MODEL_NAME)
+warmup_notice(model_warmer)
+debug_panel()
+
 # Custom CSS for chat messages
-st.markdown("""
-    <style>
+apply_style("""
     .user-message {
         background-color: #e3f2fd;
         padding: 10px;
@@ -64,103 +54,59 @@ st.markdown("""
         color: #888;
         font-style: italic;
     }
-    </style>
-    """, unsafe_allow_html=True)
-
-# Toggle voice option
-st.session_state.voice_enabled = st.checkbox("🔊 Enable Voice Response", st.session_state.voice_enabled)
-
-# Dropdown for voice selection
-st.session_state.voice_gender = st.selectbox("🎤 Choose Voice Gender", ["Female", "Male"], index=0)
-
-# Function to speak text using ElevenLabs
-def speak(text):
-    if not st.session_state.voice_enabled:
-        return
-    try:
-        # Select voice based on gender
-        voice_id = "EXAVITQu4vr4xnSDxMaL"  # Bella's voice ID (Female)
-        if st.session_state.voice_gender == "Male":
-            voice_id = "TxGEqnHWrfWFTfGW9XjX"  # Josh's voice ID (Male)
-
-        # Generate speech with ElevenLabs
-        audio = generate(
-            text=text,
-            voice=Voice(voice_id=voice_id, settings=VoiceSettings(stability=0.5, similarity_boost=0.8))
-        )
-
-        # Save the audio to a temporary file
-        with open("temp_audio.mp3", "wb") as f:
-            f.write(audio)
-
-        # Play the generated audio
-        pygame.mixer.music.load("temp_audio.mp3")
-        pygame.mixer.music.play()
-
-        # Wait for the audio to finish playing
-        while pygame.mixer.music.get_busy():
-            time.sleep(0.1)
-
-        # Clean up the temporary file
-        os.remove("temp_audio.mp3")
-    except Exception as e:
-        st.error(f"Voice Error: {e}")
+""")
+
+# Voice output is only read when a reply is spoken, so changing it redraws just these widgets
+@st.fragment
+def voice_settings():
+    # Toggle voice option
+    st.session_state.voice_enabled = st.checkbox("🔊 Enable Voice Response", st.session_state.voice_enabled)
+
+    # Dropdown for voice selection
+    st.session_state.voice_gender = st.selectbox("🎤 Choose Voice Gender", ["Female", "Male"], index=0)
+
+voice_settings()
+
+# Optional human-like typing effect
+st.session_state.typing_effect = st.checkbox("✍ Human-like Typing", st.session_state.typing_effect)
 
 # Display chat history
+def render_message(msg):
+    role_class = "user-message" if msg['role'] == 'user' else "nia-message"
+    st.markdown(f"<div class='{role_class}'>{msg['text']}</div>", unsafe_allow_html=True)
+
 chat_container = st.container()
 with chat_container:
-    for msg in st.session_state.messages:
-        role_class = "user-message" if msg['role'] == 'user' else "nia-message"
-        st.markdown(f"<div class='{role_class}'>{msg['text']}</div>", unsafe_allow_html=True)
+    render_history(st.session_state.messages, render_message)
 
 # Clear chat button
 if st.button("🗑 Clear Chat History"):
+    settle_reply()  # Stop a reply that is still streaming
     st.session_state.messages = []
     save_memory()
-    st.experimental_rerun()
+    st.rerun()
 
 # User input
 user_input = st.chat_input("Type a message...")
 if user_input:
+    settle_reply()  # Cancel and keep a reply that is still streaming
+    start_turn("master")  # Traces every stage of this turn; the worker finishes it
     st.session_state.messages.append({'role': 'user', 'text': user_input})
     save_memory()
-
-    # Show typing effect
-    typing_indicator = st.empty()
-    typing_indicator.markdown("<div class='typing'>Nia is typing...</div>", unsafe_allow_html=True)
-    
-    # Simulate human-like typing delay
-    time.sleep(min(3, max(1.5, len(user_input) * 0.05)))
-
-    # Keep only last 8 messages to maintain relevant chat memory
-    chat_history = st.session_state.messages[-8:]
-
-    # Generate AI response with memory
-    ai_prompt = f"""
-    You are Nia, an AI companion who provides emotional support. Your tone should be warm, casual, and human-like. Keep responses short but meaningful. 
-    Here is the recent chat history:
-    {chat_history}
-    
-    User: {user_input}
-    Nia:"""
-
-    response = ollama.chat(model='mistral:latest', messages=[{"role": "user", "content": ai_prompt}], stream=True)
-
-    bot_reply = ""
-    for chunk in response:
-        bot_reply += chunk['message']['content']
-        # Update the UI with the partial response
-        typing_indicator.markdown(f"<div class='nia-message'>{bot_reply}</div>", unsafe_allow_html=True)
-        time.sleep(0.05)  # Simulate typing delay
-
-    bot_reply = bot_reply.strip()
-
-    typing_indicator.empty()
-
-    # Speak if voice is enabled
-    speak(bot_reply)
-
-    # Save and display AI response
-    st.session_state.messages.append({'role': 'assistant', 'text': bot_reply})
-    save_memory()
-    st.experimental_rerun() 
\ No newline at end of file
+    with chat_container:
+        render_message(st.session_state.messages[-1])
+
+    # Generated in the background and speaking each sentence as soon as it
+    # is complete; the finished reply needs no rerun
+    speech = start_elevenlabs_speech(ELEVENLABS_API_KEY)
+    start_reply(
+        MODEL_NAME,
+        SYSTEM_PROMPT,
+        on_text=speech.feed if speech else None,
+        on_finish=speech.finish if speech else None,
+    )
+
+# Stream the reply from a fragment, redrawing at the poll rate
+with chat_container:
+    show_reply(render_message, typing_speed=60 if st.session_state.typing_effect else None)
+show_speech_error()
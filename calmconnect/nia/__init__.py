@@ -0,0 +1 @@
+"""Shared helpers for the Nia companion apps."""
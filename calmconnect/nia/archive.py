@@ -0,0 +1,254 @@
+"""Compact, streamable archives of chat history.
+
+An archive is a gzip file holding a magic header and a sequence of
+length-prefixed records: a 4-byte little-endian length followed by that many
+bytes of UTF-8 JSON. A `{"log": name}` record starts the history of one
+user's log (`name` is its path under the store root, e.g. `shard-03/ab12…`),
+and each `{"m": message}` record after it is one message of that log.
+
+Writing and reading go one record at a time, so backups, restores and
+offline analysis of large histories run in constant memory:
+
+    for log, message in iter_archive("backup.nia"):
+        ...
+
+Command line, from the app directory (restore while the app is stopped,
+running sessions keep their own view of the logs):
+
+    python -m nia.archive export backup.nia
+    python -m nia.archive import backup.nia
+    python -m nia.archive convert chat_memory backup.nia
+    python -m nia.archive cat backup.nia
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import shelve
+import struct
+import sys
+import zlib
+
+from nia.memory import ChatLog, SessionStore
+
+MAGIC = b"NIA\x01"
+LENGTH = struct.Struct("<I")
+IMPORT_BATCH = 1000  # Messages written to a log per append
+LOG_NAME = re.compile(r"shard-\d+/[0-9a-f]+")
+
+
+class ArchiveError(ValueError):
+    """The file is not a chat archive, or it is truncated or corrupt."""
+
+
+class ArchiveWriter:
+    """Writes records to a new archive; use as a context manager."""
+
+    def __init__(self, path, compresslevel=6):
+        self._file = gzip.open(path, "wb", compresslevel=compresslevel)
+        self._file.write(MAGIC)
+        self.records = 0
+
+    def write(self, record):
+        data = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._file.write(LENGTH.pack(len(data)))
+        self._file.write(data)
+        self.records += 1
+
+    def write_log(self, name, messages):
+        """Write one log's history; `messages` may be any iterable."""
+        self.write({"log": name})
+        count = 0
+        for message in messages:
+            self.write({"m": message})
+            count += 1
+        return count
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_records(path):
+    """Yield the raw records of an archive in order."""
+    with gzip.open(path, "rb") as f:
+        try:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ArchiveError(f"{path} is not a chat archive")
+            while True:
+                header = f.read(LENGTH.size)
+                if not header:
+                    return
+                if len(header) < LENGTH.size:
+                    raise ArchiveError(f"{path} is truncated")
+                (size,) = LENGTH.unpack(header)
+                data = f.read(size)
+                if len(data) < size:
+                    raise ArchiveError(f"{path} is truncated")
+                yield json.loads(data)
+        except ArchiveError:
+            raise
+        except gzip.BadGzipFile as e:
+            raise ArchiveError(f"{path} is not a chat archive: {e}") from e
+        except (EOFError, zlib.error, ValueError) as e:
+            # gzip raises EOFError when the file was cut short on disk, json a ValueError
+            raise ArchiveError(f"{path} is truncated or corrupt: {e}") from e
+
+
+def iter_archive(path):
+    """Yield `(log name, message)` for every message in an archive."""
+    log = None
+    for record in iter_records(path):
+        if "log" in record:
+            log = record["log"]
+        else:
+            yield log, record["m"]
+
+
+def log_names(root):
+    """Names of the logs under a SessionStore root, in a stable order."""
+    for shard in sorted(os.listdir(root)):
+        shard_path = os.path.join(root, shard)
+        if shard.startswith("shard-") and os.path.isdir(shard_path):
+            for digest in sorted(os.listdir(shard_path)):
+                yield f"{shard}/{digest}"
+
+
+def log_name(store, user_id):
+    """Name of `user_id`'s log in an archive of `store`."""
+    return os.path.relpath(store.path_for(user_id), store.root).replace(os.sep, "/")
+
+
+def user_log_names(root, user_ids):
+    """Names of the given users' logs under `root`, whatever its shard count."""
+    digests = {os.path.basename(SessionStore(root).path_for(user_id)) for user_id in user_ids}
+    return [name for name in log_names(root) if name.rsplit("/", 1)[1] in digests]
+
+
+def export_store(root, path, names=None):
+    """Write the logs under `root` (or just `names`) to a new archive.
+
+    Returns `(logs, messages)` written.
+    """
+    logs = messages = 0
+    with ArchiveWriter(path) as writer:
+        for name in (log_names(root) if names is None else names):
+            messages += writer.write_log(name, ChatLog(os.path.join(root, name)).iter_messages())
+            logs += 1
+    return logs, messages
+
+
+def import_archive(path, root):
+    """Restore every log in an archive under `root`, replacing its history.
+
+    The whole archive is checked before any log is touched, so a truncated or
+    corrupt file leaves the store as it was. Each log is compacted before the
+    next one is restored, so the old history is gone from disk when this
+    returns. Returns `(logs, messages)` restored.
+    """
+    check_archive(path)
+    logs = messages = 0
+    log, batch = None, []
+    for record in iter_records(path):
+        if "log" in record:
+            _finish(log, batch)
+            log = ChatLog(os.path.join(root, *record["log"].split("/")), background_compaction=False)
+            batch = []
+            log.clear()
+            logs += 1
+            continue
+        batch.append(record["m"])
+        messages += 1
+        if len(batch) >= IMPORT_BATCH:
+            _flush(log, batch)
+            batch = []
+    _finish(log, batch)
+    return logs, messages
+
+
+def check_archive(path):
+    """Read a whole archive, raising ArchiveError if it can't be imported."""
+    seen_log = False
+    for record in iter_records(path):
+        if "log" in record:
+            if not LOG_NAME.fullmatch(record["log"]):
+                raise ArchiveError(f"{path} has an invalid log name {record['log']!r}")
+            seen_log = True
+        elif not seen_log:
+            raise ArchiveError(f"{path} has messages before its first log")
+        elif "m" not in record:
+            raise ArchiveError(f"{path} has a record that is neither a log nor a message")
+
+
+def _flush(log, batch):
+    if log is not None and batch:
+        log.append(*batch)
+
+
+def _finish(log, batch):
+    # Fold the cleared history away here rather than in a daemon thread the exit would kill
+    _flush(log, batch)
+    if log is not None:
+        log.compact()
+
+
+def convert_shelve(shelve_path, path, root="chat_sessions", user_id="default", key="messages"):
+    """Write the history in an old `shelve` file to a new archive.
+
+    The shelve stores the history as one pickled list, so it is loaded whole
+    once; the archive is written record by record. The log is named after
+    `user_id`'s place in a store at `root`, so importing it restores it for
+    that user. Returns the number of messages written.
+    """
+    name = log_name(SessionStore(root), user_id)
+    with shelve.open(shelve_path, flag="r") as db:
+        messages = db.get(key, [])
+    with ArchiveWriter(path) as writer:
+        return writer.write_log(name, messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, import and inspect chat history archives.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write every chat log to an archive")
+    export.add_argument("archive")
+    export.add_argument("--root", default="chat_sessions", help="chat store directory")
+    export.add_argument("--user", action="append", help="only this user's log (repeatable)")
+    restore = commands.add_parser("import", help="restore the chat logs in an archive")
+    restore.add_argument("archive")
+    restore.add_argument("--root", default="chat_sessions", help="chat store directory")
+    convert = commands.add_parser("convert", help="convert an old shelve file to an archive")
+    convert.add_argument("shelve")
+    convert.add_argument("archive")
+    convert.add_argument("--root", default="chat_sessions", help="chat store the archive is meant for")
+    convert.add_argument("--user", default="default", help="user the shelve history belongs to")
+    cat = commands.add_parser("cat", help="print an archive's messages as JSON lines")
+    cat.add_argument("archive")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            names = user_log_names(args.root, args.user) if args.user else None
+            logs, messages = export_store(args.root, args.archive, names)
+            print(f"Exported {messages} messages from {logs} logs to {args.archive}")
+        elif args.command == "import":
+            logs, messages = import_archive(args.archive, args.root)
+            print(f"Imported {messages} messages into {logs} logs under {args.root}")
+        elif args.command == "convert":
+            messages = convert_shelve(args.shelve, args.archive, args.root, args.user)
+            print(f"Converted {messages} messages from {args.shelve} to {args.archive}")
+        else:
+            for log, message in iter_archive(args.archive):
+                print(json.dumps({"log": log, "m": message}, ensure_ascii=False))
+    except (OSError, ArchiveError) as e:
+        sys.exit(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Cached, fingerprinted assets for backgrounds and CSS.
+
+Background images are copied once per process into Streamlit's static folder
+under a content-hash name (`background.0aa2eea64fa7.png`), so browsers cache
+them and a rerun sends a short URL instead of the base64-encoded file. The
+`<style>` markup around them is built once and memoized by file mtime, so
+replacing `background.png` picks up a new hash without a restart.
+
+CSS itself stays inline: Streamlit releases before the starlette server send
+static `.css` files as `text/plain` with `nosniff`, which browsers refuse to
+apply.
+
+Needs `server.enableStaticServing = true` in `.streamlit/config.toml`.
+"""
+import base64
+import hashlib
+import os
+import threading
+
+import streamlit as st
+
+from nia.tracing import get_recorder
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+STATIC_URL = "app/static"
+HASH_CHARS = 12
+
+BACKGROUND_CSS = """
+body {{
+    background-image: url('{url}');
+    background-size: cover;
+    background-position: center;
+    background-attachment: fixed;
+}}
+"""
+
+_images = {}  # abspath -> (mtime, url, inline size)
+_styles = {}  # (css, background, mtime) -> (markup, inline size)
+_lock = threading.Lock()
+
+
+def _publish(path, data):
+    """Write `data` as `<stem>.<hash><ext>` into the static folder; return its URL."""
+    stem, ext = os.path.splitext(os.path.basename(path))
+    filename = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_CHARS]}{ext}"
+    target = os.path.join(STATIC_DIR, filename)
+    if not os.path.exists(target):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+    return f"{STATIC_URL}/{filename}"
+
+
+def _image(path):
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    cached = _images.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            data = f.read()
+        inline = len("data:image/png;base64,") + len(base64.b64encode(data))
+        cached = _images[path] = (mtime, _publish(path, data), inline)
+    return cached
+
+
+def static_url(path):
+    """Content-hash URL for the file at `path`."""
+    with _lock:
+        return _image(path)[1]
+
+
+def stylesheet(css, background=None):
+    """`<style>` markup for `css` plus an optional background image.
+
+    Returns the markup and how many bytes it would be with the image inlined.
+    """
+    with _lock:
+        image = _image(background) if background else None
+        key = (css, background, image and image[0])
+        cached = _styles.get(key)
+        if cached is None:
+            inline = 0
+            if image:
+                css += BACKGROUND_CSS.format(url=image[1])
+                inline = image[2] - len(image[1])
+            markup = f"<style>{css}</style>"
+            cached = _styles[key] = (markup, len(markup.encode("utf-8")) + inline)
+        return cached
+
+
+def apply_style(css, background=None):
+    """Render the memoized stylesheet and report the per-rerun payload."""
+    markup, inline = stylesheet(css, background)
+    st.markdown(markup, unsafe_allow_html=True)
+    recorder = get_recorder()
+    recorder.gauge("asset_payload_bytes", len(markup.encode("utf-8")))
+    recorder.gauge("asset_inline_bytes", inline)
@@ -0,0 +1,111 @@
+"""Content-addressed cache for synthesized speech.
+
+Audio is stored on disk under a hash of everything that affects how it sounds
+(text, voice and voice settings), so greetings, affirmations and other
+repeated phrases are synthesized once. The cache keeps to a size cap by
+evicting the least recently used clips; file mtimes record recency, so the
+order survives restarts.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+CACHE_BYTES = int(os.environ.get("NIA_AUDIO_CACHE_MB", "200")) * 1024 * 1024
+SUFFIX = ".audio"
+
+
+class AudioCache:
+    """Disk-backed LRU cache of audio clips."""
+
+    def __init__(self, path="audio_cache", max_bytes=CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> size, least recently used first
+        self._total = 0
+        os.makedirs(path, exist_ok=True)
+        entries = []
+        for name in os.listdir(path):
+            if name.endswith(SUFFIX):
+                stat = os.stat(os.path.join(path, name))
+                entries.append((stat.st_mtime, name[:-len(SUFFIX)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+
+    @staticmethod
+    def key(text, voice, settings=None):
+        """Cache key for `text` spoken by `voice` with `settings`."""
+        blob = json.dumps([text, voice, settings], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + SUFFIX)
+
+    def get(self, key):
+        """Return the cached audio for `key`, or None."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(self._file(key))
+            with open(self._file(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._index.pop(key, 0)
+            return None
+
+    def put(self, key, audio):
+        # A temp file of its own, so concurrent writes of the same key don't collide
+        fd, tmp = tempfile.mkstemp(prefix=key + ".", suffix=".tmp", dir=self.path)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, self._file(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        with self._lock:
+            self._total += len(audio) - self._index.pop(key, 0)
+            self._index[key] = len(audio)
+            while self._total > self.max_bytes and len(self._index) > 1:
+                old, size = self._index.popitem(last=False)
+                self._total -= size
+                try:
+                    os.remove(self._file(old))
+                except FileNotFoundError:
+                    pass
+
+    def get_or_create(self, key, synthesize):
+        """Return cached audio for `key`, calling `synthesize()` on a miss."""
+        audio = self.get(key)
+        if audio is None:
+            audio = synthesize()
+            self.put(key, audio)
+        return audio
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._index), "bytes": self._total}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """Return the process-wide AudioCache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AudioCache()
+        return _cache
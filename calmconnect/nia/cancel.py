@@ -0,0 +1,149 @@
+"""Cancellable generations.
+
+A Generation wraps a streamed Ollama response. Closing it closes the stream,
+which drops the HTTP connection so the server stops generating, and keeps
+the text that already arrived. Each session has at most one running
+generation: starting a new one, pressing Stop or clearing the chat cancels
+it. Cancelling only sets a flag, and the thread reading the stream closes it
+at the next chunk, since a generator cannot be closed from another thread
+while it is running.
+
+A generation still waiting in the scheduler's queue is withdrawn from it, so
+a cancelled reply never takes a slot.
+
+Tokens saved are estimated from the average length of completed replies.
+Only generations stopped on request count as cancelled; one whose stream
+failed is not.
+"""
+import threading
+
+from nia.client import get_client
+from nia.prompt import REPLY_TOKENS
+from nia.scheduler import Withdrawn
+from nia.tracing import get_recorder
+
+SMOOTHING = 0.1  # Weight of the newest reply in the average reply length
+
+
+class Generation:
+    """Iterator over a streamed response that can be cancelled."""
+
+    def __init__(self, chunks, registry=None, session_id=None):
+        self._chunks = iter(chunks)
+        self._cancelled = threading.Event()
+        self._registry = registry
+        self.session_id = session_id
+        self.parts = []
+        self.tokens = 0
+        self.done = False
+        self.closed = False
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def cancelled(self):
+        # Stopped on request; a stream that failed is closed but not cancelled
+        return self._cancelled.is_set() and self.closed and not self.done
+
+    def cancel(self):
+        """Ask the reading thread to stop at the next chunk."""
+        self._cancelled.set()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._cancelled.is_set():
+            self.close()
+        if self.closed:
+            raise StopIteration
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.done = True
+            self.close()
+            raise
+        except Withdrawn:
+            self.close()
+            raise StopIteration
+        piece = chunk["message"]["content"]
+        if piece:
+            self.parts.append(piece)
+            self.tokens += 1
+        if chunk.get("done"):
+            self.done = True
+            self.tokens = chunk.get("eval_count") or self.tokens
+        return chunk
+
+    def close(self):
+        """Close the stream, keeping the partial text; safe to call twice."""
+        if self.closed:
+            return
+        self.closed = True
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+        if self._registry is not None:
+            self._registry._finished(self)
+
+
+class GenerationRegistry:
+    """The running generation of each session."""
+
+    def __init__(self):
+        self._running = {}  # session id -> Generation
+        self._average_tokens = REPLY_TOKENS / 2
+        self._lock = threading.Lock()
+
+    def start(self, session_id, chunks):
+        """Wrap `chunks` in a Generation, cancelling the session's previous one."""
+        generation = Generation(chunks, self, session_id)
+        with self._lock:
+            previous = self._running.get(session_id)
+            self._running[session_id] = generation
+        if previous is not None:
+            previous.cancel()
+            get_client().scheduler.withdraw(session_id)  # The new one is not queued yet
+        return generation
+
+    def cancel(self, session_id):
+        """Cancel the session's running generation, if any."""
+        with self._lock:
+            generation = self._running.get(session_id)
+        if generation is not None:
+            generation.cancel()
+            get_client().scheduler.withdraw(session_id)
+        return generation is not None
+
+    def running(self, session_id):
+        with self._lock:
+            return self._running.get(session_id)
+
+    def _finished(self, generation):
+        recorder = get_recorder()
+        with self._lock:
+            if self._running.get(generation.session_id) is generation:
+                del self._running[generation.session_id]
+            if generation.done:
+                self._average_tokens += SMOOTHING * (generation.tokens - self._average_tokens)
+                return
+            if not generation.cancelled:
+                return
+            saved = max(0, round(self._average_tokens) - generation.tokens)
+        recorder.count("cancelled_generations_total")
+        recorder.count("cancel_tokens_saved_total", saved)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_generations():
+    """Return the process-wide GenerationRegistry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = GenerationRegistry()
+        return _registry
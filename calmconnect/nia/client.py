@@ -0,0 +1,105 @@
+"""One shared Ollama client per process.
+
+The client keeps HTTP connections to the server alive between requests, and
+every call goes through a FairScheduler shared by all sessions: at most
+`max_concurrency` requests run at once, at most `max_queue` more wait for a
+slot, and anything beyond that fails fast with QueueFull instead of piling
+onto the server. Callers pass `session_id` and `priority` so waiting requests
+are served interactive first and round-robin across sessions.
+
+Every call also pins the model in memory for `KEEP_ALIVE` unless the caller
+asks otherwise, so it is not unloaded between quiet conversations.
+"""
+import os
+import threading
+
+import httpx
+import ollama
+
+from nia.scheduler import INTERACTIVE, FairScheduler, QueueFull  # noqa: F401 (QueueFull re-exported)
+
+MAX_CONCURRENCY = int(os.environ.get("NIA_MAX_CONCURRENCY", "2"))
+MAX_QUEUE = int(os.environ.get("NIA_MAX_QUEUE", "16"))
+KEEPALIVE_EXPIRY = 300  # Seconds an idle connection stays open
+KEEP_ALIVE = os.environ.get("NIA_KEEP_ALIVE", "30m")  # How long Ollama keeps the model loaded
+
+
+class OllamaPool:
+    """Ollama client with pooled keep-alive connections and a fair, bounded queue."""
+
+    def __init__(self, host=None, max_concurrency=MAX_CONCURRENCY, max_queue=MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        limits = httpx.Limits(
+            max_connections=max_concurrency + 1,  # One spare for health checks
+            max_keepalive_connections=max_concurrency + 1,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        self.client = ollama.Client(host=host, limits=limits)
+        self.scheduler = FairScheduler(max_concurrency, max_queue)
+
+    @property
+    def active(self):
+        return self.scheduler.active
+
+    @property
+    def waiting(self):
+        return self.scheduler.waiting
+
+    @property
+    def queue_depth(self):
+        """Requests running or waiting for a slot."""
+        return self.waiting + self.active
+
+    def slot(self, session_id=None, priority=INTERACTIVE):
+        """Hold one of the concurrency slots for the duration of a request."""
+        return self.scheduler.slot(session_id, priority)
+
+    def position(self, session_id):
+        """Place in line of the session's next waiting request, or None."""
+        return self.scheduler.position(session_id)
+
+    def chat(self, session_id=None, priority=INTERACTIVE, **kwargs):
+        """Same arguments as `ollama.chat`, plus who is asking and how urgently."""
+        kwargs.setdefault("keep_alive", KEEP_ALIVE)
+        if kwargs.get("stream"):
+            return self._stream(self.client.chat, kwargs, session_id, priority)
+        with self.slot(session_id, priority):
+            return self.client.chat(**kwargs)
+
+    def generate(self, session_id=None, priority=INTERACTIVE, **kwargs):
+        """Same arguments as `ollama.generate`, plus who is asking and how urgently."""
+        kwargs.setdefault("keep_alive", KEEP_ALIVE)
+        if kwargs.get("stream"):
+            return self._stream(self.client.generate, kwargs, session_id, priority)
+        with self.slot(session_id, priority):
+            return self.client.generate(**kwargs)
+
+    def embed(self, **kwargs):
+        """Same arguments as `ollama.embed`.
+
+        Embeddings are small and use their own model, so they skip the queue
+        instead of waiting behind long generations.
+        """
+        kwargs.setdefault("keep_alive", KEEP_ALIVE)
+        return self.client.embed(**kwargs)
+
+    def _stream(self, call, kwargs, session_id, priority):
+        # The slot is taken when the first chunk is requested and released
+        # once the stream is exhausted or closed.
+        with self.slot(session_id, priority):
+            yield from call(**kwargs)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide OllamaPool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OllamaPool()
+    return _pool
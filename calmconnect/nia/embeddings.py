@@ -0,0 +1,26 @@
+"""Unit-length embeddings from the local Ollama embedding model."""
+import functools
+import os
+
+import numpy as np
+
+from nia.client import get_client
+
+EMBED_MODEL = os.environ.get("NIA_EMBED_MODEL", "nomic-embed-text")
+
+
+def embed_many(texts, model=EMBED_MODEL):
+    """(len(texts), dims) float32 array of unit vectors from one batched call."""
+    vectors = np.asarray(get_client().embed(model=model, input=list(texts))["embeddings"], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+@functools.lru_cache(maxsize=256)
+def embed(text, model=EMBED_MODEL):
+    """Unit vector for one text.
+
+    Cached, because a message is usually embedded for a lookup and then
+    again right after to be stored.
+    """
+    return embed_many([text], model)[0]
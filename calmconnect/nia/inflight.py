@@ -0,0 +1,90 @@
+"""In-flight registry for coalescing duplicate submits.
+
+Streamlit never runs two scripts of one session at once: a second click on
+"Send" interrupts the running script and reruns it right after, with the
+same message. So each session's latest generation is kept under a hash of
+its message until `REPEAT_WINDOW` seconds after it finishes. Submitting the
+same message while it is still generating, or just after (a double click),
+gets that generation's reply instead of a new model call. Sending the same
+text again later ("ok", "thanks") is a new turn, and a failed generation is
+dropped at once so it can be retried.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from nia.tracing import get_recorder
+
+MAX_SESSIONS = 4096  # Oldest sessions are forgotten beyond this
+REPEAT_WINDOW = 3.0  # Seconds a finished reply still answers a repeat of its message
+
+
+def message_key(message):
+    return hashlib.sha256(message.encode("utf-8")).hexdigest()
+
+
+class Entry:
+    def __init__(self, key):
+        self.key = key
+        self.future = Future()
+        self.finished_at = None  # time.monotonic() once the reply is in
+
+    def answers(self, key, now, window):
+        return self.key == key and (self.finished_at is None or now - self.finished_at <= window)
+
+
+class InFlightRegistry:
+    """Latest generation per session, keyed by message hash."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, repeat_window=REPEAT_WINDOW):
+        self.max_sessions = max_sessions
+        self.repeat_window = repeat_window
+        self._entries = OrderedDict()  # session id -> Entry
+        self._lock = threading.Lock()
+
+    def run(self, session_id, message, generate):
+        """Return `(reply, attached)`.
+
+        Calls `generate()` unless the session is generating, or has just
+        generated, a reply to the same message, in which case that reply is
+        returned once it is in and `attached` is True.
+        """
+        key = message_key(message)
+        with self._lock:
+            entry = self._entries.get(session_id)
+            attached = entry is not None and entry.answers(key, time.monotonic(), self.repeat_window)
+            if not attached:
+                entry = self._entries[session_id] = Entry(key)
+                while len(self._entries) > self.max_sessions:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(session_id)
+        if attached:
+            get_recorder().count("inflight_attached_total")
+            return entry.future.result(), True
+
+        try:
+            reply = generate()
+        except BaseException as e:
+            with self._lock:
+                if self._entries.get(session_id) is entry:
+                    del self._entries[session_id]
+            entry.future.set_exception(e)
+            raise
+        entry.finished_at = time.monotonic()
+        entry.future.set_result(reply)
+        return reply, False
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_inflight():
+    """Return the process-wide InFlightRegistry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = InFlightRegistry()
+        return _registry
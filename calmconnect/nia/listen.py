@@ -0,0 +1,117 @@
+"""Voice input with a pluggable recognizer and chunked, partial transcripts.
+
+Ambient-noise calibration runs once per VoiceInput (one per Streamlit
+session) instead of before every utterance. The utterance ends after
+`PAUSE_SECONDS` of silence, as detected by the recognizer's energy-based
+voice activity detection. Longer speech is cut into `CHUNK_SECONDS` chunks,
+and each chunk is transcribed as soon as it ends, so partial text appears
+while the user is still talking. Local backends (Vosk, Whisper, faster-whisper, Sphinx) avoid
+the network hop; Google stays available as a fallback. The same chunking runs
+over WAV files, which makes recognition testable offline.
+"""
+import audioop
+import importlib.util
+import json
+import os
+
+import speech_recognition as sr
+
+CALIBRATION_SECONDS = 0.5
+CHUNK_SECONDS = 4  # Longest chunk transcribed in one go
+LISTEN_TIMEOUT = 4  # Seconds of silence before giving up on the first chunk
+PAUSE_SECONDS = 0.8  # Silence that ends the utterance
+TAIL_SECONDS = 0.1  # End of a chunk checked for silence
+
+# Backend name -> (module it needs, Recognizer method)
+BACKENDS = {
+    "vosk": ("vosk", "recognize_vosk"),
+    "faster_whisper": ("faster_whisper", "recognize_faster_whisper"),
+    "whisper": ("whisper", "recognize_whisper"),
+    "sphinx": ("pocketsphinx", "recognize_sphinx"),
+    "google": (None, "recognize_google"),
+}
+
+
+def pick_backend(name=None):
+    """Return `name`, or the first local backend that is installed."""
+    name = name or os.environ.get("NIA_STT_BACKEND", "auto")
+    if name != "auto":
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown speech recognition backend: {name}")
+        return name
+    for backend, (module, _) in BACKENDS.items():
+        if module is None or importlib.util.find_spec(module) is not None:
+            return backend
+
+
+class VoiceInput:
+    """Microphone or WAV transcription with cached calibration."""
+
+    def __init__(self, backend=None):
+        self.backend = pick_backend(backend)
+        self.recognizer = sr.Recognizer()
+        self.recognizer.pause_threshold = PAUSE_SECONDS
+        # A threshold that adapts mid-phrase climbs over steady speech and cuts it off
+        self.recognizer.dynamic_energy_threshold = False
+        self.calibrated = False
+
+    def recognize(self, audio):
+        """Transcribe one chunk of AudioData with the selected backend."""
+        text = getattr(self.recognizer, BACKENDS[self.backend][1])(audio)
+        if self.backend == "vosk":
+            text = json.loads(text).get("text", "")  # Vosk returns its raw JSON result
+        return text.strip()
+
+    def transcribe_chunks(self, source, live=True):
+        """Yield the transcript so far after each speech chunk.
+
+        Raises sr.WaitTimeoutError if nobody speaks and sr.UnknownValueError
+        if speech was heard but nothing could be recognized.
+        """
+        if live and not self.calibrated:
+            self.recognizer.adjust_for_ambient_noise(source, duration=CALIBRATION_SECONDS)
+            self.calibrated = True
+        words = []
+        heard = False
+        timeout = LISTEN_TIMEOUT  # Only the first chunk may wait this long for speech
+        while True:
+            try:
+                audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=CHUNK_SECONDS)
+            except sr.WaitTimeoutError:
+                if heard:
+                    break
+                raise
+            if len(audio.frame_data) < audio.sample_width * audio.sample_rate * 0.1:
+                break  # End of a WAV file
+            heard = True
+            try:
+                text = self.recognize(audio)
+            except sr.UnknownValueError:
+                text = ""  # Noise or a cough
+            if text:
+                words.append(text)
+                yield " ".join(words)
+            if self._ended_on_pause(audio):
+                break  # The recognizer already waited PAUSE_SECONDS of silence
+            # Cut off mid-speech: the next chunk starts right away unless the speaker stops
+            timeout = PAUSE_SECONDS
+        if heard and not words:
+            raise sr.UnknownValueError()
+
+    def _ended_on_pause(self, audio):
+        # A chunk closed by a pause ends in silence, one cut by the time limit doesn't
+        tail = audio.frame_data[-int(audio.sample_rate * TAIL_SECONDS) * audio.sample_width:]
+        return audioop.rms(tail, audio.sample_width) <= self.recognizer.energy_threshold
+
+    def listen(self):
+        """Yield partial transcripts from the microphone."""
+        with sr.Microphone() as source:
+            yield from self.transcribe_chunks(source)
+
+    def transcribe_file(self, path):
+        """Transcribe a recorded WAV/AIFF/FLAC file; returns the full text."""
+        text = ""
+        with sr.AudioFile(path) as source:
+            for text in self.transcribe_chunks(source, live=False):
+                pass
+        return text
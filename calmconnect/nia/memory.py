@@ -0,0 +1,337 @@
+"""Append-only chat log storage.
+
+Every message is written as one JSON line to the newest segment file, so a
+save costs O(new messages) instead of re-pickling the whole history. Loading
+replays the segments in order. Old segments are folded into a single one by a
+background compaction thread.
+
+Each user gets their own log, and logs are spread over shard directories, so
+sessions for different users never touch the same files or locks.
+"""
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import shelve
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+SEGMENT_BYTES = 4 * 1024 * 1024  # Roll over to a new segment after 4 MB
+COMPACT_AFTER = 4  # Compact once this many sealed segments pile up
+
+CLEAR = {"clear": True}
+LOCK_FILE = ".lock"
+COMPACT_LOCK_FILE = ".compact.lock"
+GENERATION_FILE = "generation"  # Counts clears, for readers that track positions in the log
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive lock on `path`, shared with other processes."""
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ChatLog:
+    """Chat history stored as append-only segment files in one directory.
+
+    With `background_compaction=False` nothing compacts the log behind the
+    caller's back; call `compact()` when done writing (batch tools like the
+    archive import do, so they don't exit with a compaction half done).
+    """
+
+    def __init__(self, path, segment_bytes=SEGMENT_BYTES, compact_after=COMPACT_AFTER, background_compaction=True):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.compact_after = compact_after
+        self.background_compaction = background_compaction
+        self._lock = threading.Lock()
+        self._compacting = False
+        os.makedirs(path, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # The thread lock orders sessions in this process, the file lock
+        # orders other Streamlit processes writing the same log.
+        with self._lock, _file_lock(os.path.join(self.path, LOCK_FILE)):
+            yield
+
+    # Segment files -------------------------------------------------------
+
+    def _segment_path(self, number):
+        return os.path.join(self.path, f"{SEGMENT_PREFIX}{number:08d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        numbers = []
+        for name in os.listdir(self.path):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(numbers)
+
+    def _active_segment(self):
+        segments = self._segments()
+        if not segments:
+            return 1
+        number = segments[-1]
+        if os.path.getsize(self._segment_path(number)) >= self.segment_bytes:
+            return number + 1
+        return number
+
+    def _generation(self):
+        try:
+            with open(os.path.join(self.path, GENERATION_FILE), encoding="utf-8") as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return 0
+
+    def _clear_generation(self):
+        # Caller holds the lock. Bumped before the clear record is written, so
+        # a crash in between costs readers a rebuild, never a stale position.
+        path = os.path.join(self.path, GENERATION_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(self._generation() + 1))
+        os.replace(path + ".tmp", path)
+
+    def _write(self, records):
+        number = self._active_segment()
+        with open(self._segment_path(number), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _replay(paths):
+        messages = []
+        for path in paths:
+            for record in ChatLog._records(path):
+                if record.get("clear"):
+                    messages = []
+                else:
+                    messages.append(record["m"])
+        return messages
+
+    @staticmethod
+    def _records(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # Torn write from a crash; drop the partial record
+                yield json.loads(line)
+
+    @staticmethod
+    def _live(paths):
+        # Same result as _replay, streamed: find the last clear, then yield what follows
+        start = (0, 0)  # (segment index, record index) of the first live message
+        for i, path in enumerate(paths):
+            for j, record in enumerate(ChatLog._records(path)):
+                if record.get("clear"):
+                    start = (i, j + 1)
+        for i, path in enumerate(paths[start[0]:], start[0]):
+            for j, record in enumerate(ChatLog._records(path)):
+                if (i, j) >= start and not record.get("clear"):
+                    yield record["m"]
+
+    # Public API ----------------------------------------------------------
+
+    def load(self):
+        """Rebuild the message list by replaying every segment."""
+        with self._locked():
+            return self._replay(self._segment_path(n) for n in self._segments())
+
+    def iter_messages(self):
+        """Yield the live messages one at a time, in constant memory.
+
+        Holds the log's lock until the iterator is exhausted or closed.
+        """
+        with self._locked():
+            yield from self._live([self._segment_path(n) for n in self._segments()])
+
+    def messages_since(self, start):
+        """`(generation, live messages from position start on)`.
+
+        The generation changes whenever the log is cleared, so a reader that
+        keeps positions in the log (the recall index) can tell a new history
+        from a longer one.
+        """
+        with self._locked():
+            messages = self._live([self._segment_path(n) for n in self._segments()])
+            return self._generation(), list(itertools.islice(messages, start, None))
+
+    def append(self, *messages):
+        """Append messages to the log."""
+        with self._locked():
+            self._write({"m": message} for message in messages)
+        self._maybe_compact()
+
+    def clear(self):
+        """Drop all messages; old segments are removed by the next compaction."""
+        with self._locked():
+            self._clear_generation()
+            self._write([CLEAR])
+        self._maybe_compact(force=True)
+
+    def sync(self, messages, stored):
+        """Persist the part of `messages` past `stored`; returns the new count.
+
+        `stored` is how many of `messages` the caller has already saved. Each
+        session keeps its own count, since several sessions of the same user
+        write to one log. Histories only grow or get cleared, so anything past
+        it is new, and a shorter list means the chat was cleared and is
+        rewritten.
+        """
+        cleared = len(messages) < stored
+        if cleared:
+            records = [CLEAR] + [{"m": message} for message in messages]
+        else:
+            records = [{"m": message} for message in messages[stored:]]
+        if records:
+            with self._locked():
+                if cleared:
+                    self._clear_generation()
+                self._write(records)
+        self._maybe_compact(force=len(messages) == 0)
+        return len(messages)
+
+    def import_shelve(self, path, key="messages"):
+        """Copy the history stored in an old `shelve` file into the log."""
+        with shelve.open(path, flag="r") as db:
+            messages = list(db.get(key, []))
+        with self._locked():
+            self._clear_generation()
+            self._write([CLEAR] + [{"m": message} for message in messages])
+        return len(messages)
+
+    # Compaction ----------------------------------------------------------
+
+    def _maybe_compact(self, force=False):
+        if not self.background_compaction:
+            return
+        with self._lock:
+            sealed = self._segments()[:-1]
+            if self._compacting or not sealed:
+                return
+            if not force and len(sealed) < self.compact_after:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """Fold all sealed segments into one.
+
+        Appends only ever go to the newest segment, so the sealed ones can be
+        rewritten without holding the lock. Compactions of the same log, from
+        any ChatLog instance or process, take turns on a lock file of their
+        own and list the segments only once they hold it. The compacted
+        segment starts with a clear record, which keeps replay correct if we
+        crash before the older segments are deleted.
+        """
+        try:
+            with _file_lock(os.path.join(self.path, COMPACT_LOCK_FILE)):
+                self._compact()
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _compact(self):
+        with self._locked():
+            segments = self._segments()
+            # Seal the active segment so everything before it is immutable
+            if segments and os.path.getsize(self._segment_path(segments[-1])) > 0:
+                open(self._segment_path(segments[-1] + 1), "a").close()
+                segments = self._segments()
+            sealed = segments[:-1]
+        if not sealed:
+            return
+        messages = self._live([self._segment_path(n) for n in sealed])
+        target = self._segment_path(sealed[-1])
+        tmp = target + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(CLEAR) + "\n")
+            for message in messages:
+                f.write(json.dumps({"m": message}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self._locked():
+            os.replace(tmp, target)
+            for number in sealed[:-1]:
+                os.remove(self._segment_path(number))
+
+
+class SessionStore:
+    """Per-user chat logs spread over `shards` directories under `root`.
+
+    Logs are created lazily and cached, so every session for the same user in
+    this process shares one ChatLog (and its lock), while different users
+    share nothing.
+    """
+
+    def __init__(self, root="chat_sessions", shards=16, legacy_shelve=None, legacy_user="default"):
+        self.root = os.path.abspath(root)
+        self.shards = shards
+        self.legacy_shelve = legacy_shelve
+        self.legacy_user = legacy_user
+        self._logs = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, user_id):
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        shard = int(digest[:8], 16) % self.shards
+        return os.path.join(self.root, f"shard-{shard:02d}", digest)
+
+    def log(self, user_id):
+        """Return the ChatLog for `user_id`."""
+        log = self._logs.get(user_id)
+        if log is not None:
+            return log
+        with self._lock:
+            log = self._logs.get(user_id)
+            if log is None:
+                log = ChatLog(self.path_for(user_id))
+                # The old single-file history belongs to the default user
+                if (user_id == self.legacy_user and self.legacy_shelve
+                        and not log._segments() and _shelve_exists(self.legacy_shelve)):
+                    log.import_shelve(self.legacy_shelve)
+                self._logs[user_id] = log
+            return log
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_session_store(root="chat_sessions", shards=16, legacy_shelve="chat_memory"):
+    """Return the process-wide SessionStore rooted at `root`."""
+    root = os.path.abspath(root)
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = SessionStore(root, shards=shards, legacy_shelve=legacy_shelve)
+        return store
+
+
+def _shelve_exists(path):
+    # dbm backends add their own suffixes (.db, .dat/.dir/.bak, ...)
+    directory = os.path.dirname(os.path.abspath(path))
+    base = os.path.basename(path)
+    return any(name == base or name.startswith(base + ".") for name in os.listdir(directory))
@@ -0,0 +1,130 @@
+"""Pre-generated replies for fixed prompts.
+
+Buttons like "Give me a Guided Meditation" always send the same prompt, so the
+reply can be generated ahead of time. Each prompt keeps up to `size` fresh
+replies; a click takes one and a background thread generates its replacement.
+Replies older than `ttl` seconds are evicted so users don't keep seeing stale
+text after the pool sits idle.
+
+Pre-generation must never crowd out chat: it only starts once the model is
+warm, and all pools together run at most one generation at a time, so the
+other Ollama slots stay free for chat turns. Refills are bulk work and wait
+behind chat turns in the scheduler. A click that finds the pool empty is
+generated inline at interactive priority, without starting a refill next to
+it; the next `warm()` refills the pool.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from nia.client import get_client
+from nia.prompt import CHAT_OPTIONS
+from nia.router import first_token_seconds, get_router
+from nia.scheduler import BULK, INTERACTIVE
+from nia.warmup import ensure_warm
+
+POOL_SIZE = int(os.environ.get("NIA_POOL_SIZE", "2"))
+POOL_TTL = float(os.environ.get("NIA_POOL_TTL", "3600"))
+POOL_SESSION = "response_pool"  # Scheduler session shared by all pool requests
+READY_POLL = 1.0  # Seconds between checks whether pre-generation may start
+
+_refill_slot = threading.Semaphore(1)  # One pre-generation at a time, across all pools
+
+
+class ResponsePool:
+    """Background-refilled pool of replies per prompt."""
+
+    def __init__(self, generate, size=POOL_SIZE, ttl=POOL_TTL, ready=None):
+        self._generate = generate  # (prompt, priority) -> reply text
+        self._ready = ready  # () -> whether refills may start, e.g. the model is warm
+        self.size = size
+        self.ttl = ttl
+        self._entries = {}  # prompt -> deque of (created, text), oldest first
+        self._refilling = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self, entries, now):
+        while entries and now - entries[0][0] > self.ttl:
+            entries.popleft()
+
+    def take(self, prompt):
+        """Return a reply for `prompt`, from the pool when one is ready."""
+        with self._lock:
+            entries = self._entries.setdefault(prompt, deque(maxlen=self.size))
+            self._evict(entries, time.monotonic())
+            text = entries.popleft()[1] if entries else None
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if text is None:
+            return self._generate(prompt, INTERACTIVE)  # No refill competing with this one
+        self.refill(prompt)
+        return text
+
+    def available(self, prompt):
+        with self._lock:
+            entries = self._entries.get(prompt)
+            if entries is None:
+                return 0
+            self._evict(entries, time.monotonic())
+            return len(entries)
+
+    def warm(self, *prompts):
+        """Start filling the pool for `prompts`; cheap when already full."""
+        for prompt in prompts:
+            self.refill(prompt)
+
+    def refill(self, prompt):
+        with self._lock:
+            entries = self._entries.setdefault(prompt, deque(maxlen=self.size))
+            self._evict(entries, time.monotonic())
+            if len(entries) >= self.size or prompt in self._refilling:
+                return
+            self._refilling.add(prompt)
+        threading.Thread(target=self._refill, args=(prompt,), daemon=True).start()
+
+    def _refill(self, prompt):
+        try:
+            while self._ready is not None and not self._ready():
+                time.sleep(READY_POLL)
+            while self.available(prompt) < self.size:
+                with _refill_slot:
+                    text = self._generate(prompt, BULK)
+                with self._lock:
+                    self._entries[prompt].append((time.monotonic(), text))
+        except Exception as e:
+            logging.error(f"Error pre-generating response: {e}")
+        finally:
+            with self._lock:
+                self._refilling.discard(prompt)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_response_pool(model):
+    """Return the process-wide ResponsePool for `model`."""
+    with _pools_lock:
+        pool = _pools.get(model)
+        if pool is None:
+            def generate(prompt, priority):
+                router = get_router()
+                routed = router.route(model, prompt, feature="pregenerated")
+                messages = [{"role": "user", "content": prompt}]
+                started = time.perf_counter()
+                response = get_client().chat(
+                    model=routed, messages=messages, options=CHAT_OPTIONS,
+                    session_id=POOL_SESSION, priority=priority,
+                )
+                router.observe(routed, first_token_seconds(response, time.perf_counter() - started))
+                return response["message"]["content"]
+
+            warmer = ensure_warm(model)
+            pool = _pools[model] = ResponsePool(generate, ready=lambda: warmer.ready)
+        return pool
@@ -0,0 +1,56 @@
+"""Token-budgeted chat context.
+
+History is sent as native role-tagged chat messages behind a fixed system
+message, newest messages first until the `num_ctx` budget is used up. The
+first message kept only moves in steps of `CONTEXT_STEP`, so the prompt
+prefix stays identical for several turns in a row and Ollama can reuse its
+KV cache instead of re-evaluating the whole prompt.
+"""
+import os
+
+NUM_CTX = int(os.environ.get("NIA_NUM_CTX", "4096"))
+REPLY_TOKENS = int(os.environ.get("NIA_REPLY_TOKENS", "512"))  # Kept free for the reply
+CONTEXT_STEP = int(os.environ.get("NIA_CONTEXT_STEP", "8"))
+MESSAGE_OVERHEAD = 4  # Role and template tokens around each message
+
+# Send the same num_ctx with every call; a different value makes Ollama reload the model
+CHAT_OPTIONS = {"num_ctx": NUM_CTX}
+
+
+def count_tokens(text):
+    """Rough token count (about four characters per token for English)."""
+    return (len(text) + 3) // 4
+
+
+def message_text(message):
+    # The apps store messages as {"role", "text"} or {"role", "content"}
+    return message["text"] if "text" in message else message["content"]
+
+
+def build_messages(system, history, num_ctx=NUM_CTX, reserve=REPLY_TOKENS, step=CONTEXT_STEP):
+    """Return chat messages for `history` that fit in `num_ctx` tokens.
+
+    The newest message is always included. `system` may be None for apps
+    that have no persona prompt.
+    """
+    budget = num_ctx - reserve
+    if system:
+        budget -= count_tokens(system) + MESSAGE_OVERHEAD
+
+    # Walk back from the newest message until the budget runs out
+    start = len(history)
+    while start > 0:
+        cost = count_tokens(message_text(history[start - 1])) + MESSAGE_OVERHEAD
+        if cost > budget and start < len(history):
+            break
+        budget -= cost
+        start -= 1
+
+    # Round the cut up to a step boundary so the prefix stays stable
+    if start > 0 and step > 1:
+        start = min(-(-start // step) * step, len(history) - 1)
+
+    messages = [{"role": "system", "content": system}] if system else []
+    for message in history[start:]:
+        messages.append({"role": message["role"], "content": message_text(message)})
+    return messages
@@ -0,0 +1,222 @@
+"""Long-term recall over the whole chat history.
+
+The prompt only has room for the newest messages. With `NIA_RECALL=1`, every
+stored message is also embedded, incrementally and in the background after
+each save, into a compact float16 vector file kept next to the user's chat
+log. When building a prompt, the past turns most similar to the new message
+are looked up and passed along in a small, fixed token budget, so the model
+can recall old conversations without the prompt growing with the history.
+
+Row `i` of the index is message `i` of the log, whichever session wrote it:
+the index catches up by reading the log itself, and starts over when the
+log's clear generation changes.
+"""
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from nia.embeddings import EMBED_MODEL, embed, embed_many
+from nia.prompt import MESSAGE_OVERHEAD, count_tokens, message_text
+
+ENABLED = os.environ.get("NIA_RECALL", "0") == "1"
+TOP_K = int(os.environ.get("NIA_RECALL_K", "4"))
+RECALL_TOKENS = int(os.environ.get("NIA_RECALL_TOKENS", "384"))  # Prompt budget for recalled turns
+BATCH = 64  # Messages per embedding call
+SEARCH_CHUNK = 2048  # Rows converted to float32 at a time while searching
+
+VECTORS_FILE = "recall.f16"
+MESSAGES_FILE = "recall.jsonl"  # Role and text of each row, for the recalled turns
+META_FILE = "recall.json"
+RECALL_HEADER = "Earlier in your conversations with this user:"
+
+
+class RecallIndex:
+    """Embeddings of one chat log, row for row, stored in `path`."""
+
+    def __init__(self, path, model=EMBED_MODEL):
+        self.path = path
+        self.model = model
+        self.dims = None
+        self.generation = None  # The log's clear generation the rows belong to
+        self._rows = np.zeros((0, 0), dtype=np.float16)  # Capacity grows by doubling
+        self._messages = []  # {"role", "text"} of each row
+        self._count = 0
+        self._log = None  # The ChatLog the background thread catches up to
+        self._pending = False
+        self._running = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        try:
+            with open(self._file(META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get("model") != self.model or meta.get("dims") is None:
+            return  # Vectors from another model are not comparable
+        try:
+            rows = np.fromfile(self._file(VECTORS_FILE), dtype=np.float16)
+            with open(self._file(MESSAGES_FILE), encoding="utf-8") as f:
+                messages = [json.loads(line) for line in f if line.endswith("\n")]
+        except (OSError, ValueError):
+            return
+        self.dims = meta["dims"]
+        self.generation = meta.get("generation")
+        count = min(len(rows) // self.dims, len(messages))  # Drops a row torn by a crash
+        self._rows = rows[:count * self.dims].reshape(count, self.dims).copy()
+        self._messages = messages[:count]
+        self._count = count
+
+    def _reset(self, generation):
+        self.generation = generation
+        self._rows = np.zeros((0, self.dims or 0), dtype=np.float16)
+        self._messages = []
+        self._count = 0
+        os.makedirs(self.path, exist_ok=True)
+        open(self._file(VECTORS_FILE), "wb").close()
+        open(self._file(MESSAGES_FILE), "wb").close()
+        self._write_meta()
+
+    def _write_meta(self):
+        with open(self._file(META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dims": self.dims, "generation": self.generation}, f)
+
+    def _append(self, vectors, messages):
+        if self.dims != vectors.shape[1]:
+            self.dims = vectors.shape[1]
+            self._rows = np.zeros((0, self.dims), dtype=np.float16)
+            self._write_meta()
+        vectors = vectors.astype(np.float16)
+        messages = [{"role": m["role"], "text": message_text(m)} for m in messages]
+        with open(self._file(VECTORS_FILE), "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self._file(MESSAGES_FILE), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(m, ensure_ascii=False) + "\n" for m in messages)
+        if self._count + len(vectors) > len(self._rows):
+            grown = np.zeros((max(2 * len(self._rows), self._count + len(vectors)), self.dims), dtype=np.float16)
+            grown[:self._count] = self._rows[:self._count]
+            self._rows = grown
+        self._rows[self._count:self._count + len(vectors)] = vectors
+        self._messages.extend(messages)
+        self._count += len(vectors)
+
+    def __len__(self):
+        return self._count
+
+    def update(self, log):
+        """Embed whatever part of `log` is not indexed yet, in the background."""
+        with self._lock:
+            self._log = log
+            self._pending = True
+            if self._running:
+                return
+            self._running = True
+        threading.Thread(target=self._catch_up, daemon=True).start()
+
+    def _catch_up(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                self._pending = False
+                log = self._log
+            try:
+                self._index(log)
+            except Exception as e:
+                logging.error(f"Error updating recall index: {e}")
+
+    def _index(self, log):
+        # Only the background thread changes the rows, so these reads need no lock
+        generation, messages = log.messages_since(self._count)
+        if generation != self.generation:
+            # Cleared (or never indexed) since: index the new history from the top
+            generation, messages = log.messages_since(0)
+            with self._lock:
+                self._reset(generation)
+        for start in range(0, len(messages), BATCH):
+            batch = messages[start:start + BATCH]
+            vectors = embed_many([message_text(m) for m in batch], self.model)
+            with self._lock:
+                self._append(vectors, batch)
+
+    def search(self, text, k=TOP_K, exclude=()):
+        """`(rows, messages)`: the rows of the `k` messages most similar to
+        `text`, most similar first, and the `{"role", "text"}` list they index.
+
+        Messages whose `(role, text)` is in `exclude` are skipped.
+        """
+        with self._lock:
+            count = self._count
+            rows = self._rows[:count]
+            messages = self._messages[:count]
+        skip = [i for i, m in enumerate(messages) if (m["role"], m["text"]) in exclude]
+        if count == 0:
+            return [], messages
+        query = embed(text, self.model)
+        scores = np.empty(count, dtype=np.float32)
+        # float16 has no fast matmul; convert a cache-sized chunk at a time
+        chunk = np.empty((min(SEARCH_CHUNK, count), rows.shape[1]), dtype=np.float32)
+        for start in range(0, count, SEARCH_CHUNK):
+            block = rows[start:start + SEARCH_CHUNK]
+            chunk[:len(block)] = block
+            scores[start:start + len(block)] = chunk[:len(block)] @ query
+        scores[skip] = -np.inf
+        k = min(k, count - len(skip))
+        if k <= 0:
+            return [], messages
+        top = np.argpartition(scores, -k)[-k:]
+        return top[np.argsort(scores[top])[::-1]].tolist(), messages
+
+
+def recalled_message(index, history, kept, k=TOP_K, budget=RECALL_TOKENS):
+    """A system message with past turns relevant to the newest message, or None.
+
+    `kept` is how many of the newest messages are already in the prompt;
+    those are never recalled. Each hit brings its question or answer (its
+    neighbour in the log) along, and turns are added in order of relevance
+    until `budget` tokens.
+    """
+    if len(history) <= kept:
+        return None
+    in_prompt = {(m["role"], message_text(m)) for m in history[len(history) - kept:]}
+    hits, messages = index.search(message_text(history[-1]), k=k, exclude=in_prompt)
+    lines, seen = [], set()
+    budget -= count_tokens(RECALL_HEADER) + MESSAGE_OVERHEAD
+    for i in hits:
+        partner = i + 1 if messages[i]["role"] == "user" else i - 1
+        turn = [
+            j for j in sorted((i, partner))
+            if 0 <= j < len(messages) and j not in seen and (messages[j]["role"], messages[j]["text"]) not in in_prompt
+        ]
+        text = "\n".join(f"{messages[j]['role']}: {messages[j]['text']}" for j in turn)
+        if not turn or count_tokens(text) > budget:
+            continue
+        budget -= count_tokens(text)
+        seen.update(turn)
+        lines.append((turn[0], text))
+    if not lines:
+        return None
+    body = "\n".join(text for _, text in sorted(lines))  # Oldest first
+    return {"role": "system", "content": f"{RECALL_HEADER}\n{body}"}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_recall_index(path):
+    """Return the process-wide RecallIndex stored in `path`."""
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = RecallIndex(path)
+        return index
@@ -0,0 +1,73 @@
+"""Windowed chat history rendering.
+
+Only the newest `window` messages are drawn; older ones sit behind a "load
+older" button. The history is a fragment: loading older messages redraws
+just the history, and the apps keep widgets that don't change the history
+(settings, feature buttons) in fragments of their own, so a full rerun, the
+only thing that redraws the history, happens when the history changes.
+"""
+import os
+
+import streamlit as st
+
+from nia.tracing import get_recorder
+from nia.warmup import ERROR
+
+HISTORY_WINDOW = int(os.environ.get("NIA_HISTORY_WINDOW", "30"))
+
+
+def render_history(messages, render, key="history", window=HISTORY_WINDOW):
+    """Call `render(message)` for the newest messages only.
+
+    Each click on the "load older" button extends the window by `window`
+    messages for the rest of the session.
+    """
+    _history(messages, render, key, window)
+
+
+@st.fragment
+def _history(messages, render, key, window):
+    state_key = f"{key}_window"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = window
+    hidden = len(messages) - st.session_state[state_key]
+    if hidden > 0 and st.button(f"⬆ Load older messages ({hidden} hidden)", key=f"{key}_older"):
+        st.session_state[state_key] += window
+    start = max(0, len(messages) - st.session_state[state_key])
+    for message in messages[start:]:
+        render(message)
+
+
+def warmup_notice(warmer):
+    """Tell the user the model is still loading, or that loading it failed."""
+    if warmer.state == ERROR:
+        # The warmer tries again every probe interval, so the notice goes away on its own
+        st.warning(f"⚠ Nia couldn't load {warmer.model} ({warmer.error}), retrying in the background...")
+    elif not warmer.ready:
+        st.info("🌙 Nia is warming up, your first reply may take a moment...")
+
+
+def debug_panel():
+    """Sidebar table of p50/p95 per traced stage and asset payload, behind a checkbox."""
+    if not st.sidebar.checkbox("🐞 Latency Debug", key="debug_panel"):
+        return
+    rows = [
+        {
+            "stage": stage,
+            "count": values["count"],
+            "p50 (ms)": round(values["p50"] * 1000, 1),
+            "p95 (ms)": round(values["p95"] * 1000, 1),
+        }
+        for stage, values in sorted(get_recorder().summary().items())
+    ]
+    st.sidebar.table(rows)
+    gauges = get_recorder().gauges()
+    if "scheduler_active" in gauges:
+        st.sidebar.caption(
+            f"Ollama requests: {gauges['scheduler_active']} running, {gauges['scheduler_waiting']} waiting"
+        )
+    if "asset_payload_bytes" in gauges:
+        st.sidebar.caption(
+            f"Style payload per rerun: {gauges['asset_payload_bytes']} bytes "
+            f"(inline: {gauges['asset_inline_bytes']} bytes)"
+        )
@@ -0,0 +1,114 @@
+"""Latency-aware model routing.
+
+`NIA_MODEL_TIERS` lists the models to choose from, smallest first, e.g.
+`llama3.2:1b,mistral:latest`. Without it every call keeps using the app's
+own model. Each request is routed on cheap features:
+
+- light features (pre-generated affirmations and meditations) and short
+  check-ins like "hi" or "thanks" go to the smallest tier, everything else to
+  the largest;
+- when every Ollama slot is busy, the request drops one tier;
+- a tier whose recent p95 time to first token is over `NIA_LATENCY_BUDGET`
+  seconds is skipped in favour of the next smaller one.
+
+Time to first token does not grow with the length of the reply, so a few
+long meditations do not push a tier over budget. Only samples from the last
+`SAMPLE_AGE` seconds count: a skipped tier gets no new samples, and once its
+old ones age out it is tried again.
+
+Time to first token per model is recorded as the `model:<name>` stage, so it
+shows up in the debug panel and on /metrics next to the other stages.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from nia.client import get_client
+from nia.prompt import count_tokens
+from nia.tracing import current_turn, get_recorder, percentile
+from nia.warmup import ensure_warm
+
+TIERS = [m.strip() for m in os.environ.get("NIA_MODEL_TIERS", "").split(",") if m.strip()]
+LATENCY_BUDGET = float(os.environ.get("NIA_LATENCY_BUDGET", "3"))  # Seconds, p95 time to first token
+SHORT_TOKENS = int(os.environ.get("NIA_SHORT_TOKENS", "12"))  # Messages this short are check-ins
+MIN_SAMPLES = 5  # Replies needed before a tier's p95 is trusted
+SAMPLE_AGE = 300.0  # Seconds a latency sample counts towards routing
+MAX_SAMPLES = 100  # Newest samples kept per tier
+
+LIGHT_FEATURES = {"affirmation", "meditation", "pregenerated"}
+
+
+def stage_for(model):
+    return f"model:{model}"
+
+
+def first_token_seconds(response, seconds):
+    """Time to first token of a non-streamed reply that took `seconds` in all."""
+    return max(0.0, seconds - (response.get("eval_duration") or 0) / 1e9)
+
+
+class Router:
+    """Picks a model tier per request."""
+
+    def __init__(self, tiers=TIERS, budget=LATENCY_BUDGET, short_tokens=SHORT_TOKENS):
+        self.tiers = list(tiers)
+        self.budget = budget
+        self.short_tokens = short_tokens
+        self._samples = {}  # model -> deque of (monotonic time, seconds)
+        self._lock = threading.Lock()
+
+    def p95(self, model):
+        """p95 time to first token of `model` over the last SAMPLE_AGE seconds,
+        or None until there are enough samples."""
+        cutoff = time.monotonic() - SAMPLE_AGE
+        with self._lock:
+            samples = [seconds for at, seconds in self._samples.get(model, ()) if at >= cutoff]
+        return percentile(samples, 0.95) if len(samples) >= MIN_SAMPLES else None
+
+    def route(self, default, text="", feature="chat"):
+        """Model to use for a request; `default` when no tiers are configured."""
+        if not self.tiers:
+            return default
+        if feature in LIGHT_FEATURES or count_tokens(text) <= self.short_tokens:
+            tier = 0
+        else:
+            tier = len(self.tiers) - 1
+        client = get_client()
+        if client.queue_depth >= client.max_concurrency:
+            tier = max(0, tier - 1)
+        while tier > 0:
+            p95 = self.p95(self.tiers[tier])
+            if p95 is None or p95 <= self.budget:
+                break
+            tier -= 1
+        model = self.tiers[tier]
+        ensure_warm(model)  # A tier that is only used now and then stays loaded once picked
+        turn = current_turn()
+        if turn is not None:
+            turn.record["model"] = model
+        return model
+
+    def observe(self, model, seconds):
+        """Record one reply's time to first token for `model`."""
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=MAX_SAMPLES)).append((time.monotonic(), seconds))
+        get_recorder().observe(stage_for(model), seconds)
+
+    def stats(self):
+        """{model: {"count", "p50", "p95"}} for each tier."""
+        summary = get_recorder().summary()
+        return {model: summary.get(stage_for(model)) for model in self.tiers}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Return the process-wide Router."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = Router()
+        return _router
@@ -0,0 +1,173 @@
+"""Fair scheduling of Ollama requests across sessions.
+
+All Streamlit sessions in the process share one scheduler in front of the
+Ollama server. At most `max_concurrency` requests run at once. Waiting
+requests are served by priority first, interactive chat turns before bulk
+work like pre-generated replies and warm-ups, and round-robin across
+sessions within a priority. One session with several long requests queued
+gets one turn in every round, and everyone else keeps getting theirs. A bulk
+request that has waited longer than `bulk_max_wait` is served like an
+interactive one, so bulk work is never starved outright.
+
+Queue wait per priority is recorded as the `queue_wait_interactive` and
+`queue_wait_bulk` stages. Completed requests per priority (throughput) and
+the running and waiting counts are exported as `scheduler_*` metrics for
+sizing the backend.
+"""
+import contextlib
+import threading
+import time
+from collections import OrderedDict, deque
+
+from nia.tracing import get_recorder
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+BULK_MAX_WAIT = 30.0  # Seconds before a waiting bulk request is promoted
+
+
+class QueueFull(RuntimeError):
+    """Too many requests are already waiting for the Ollama server."""
+
+
+class Withdrawn(Exception):
+    """The request was withdrawn from the queue before it got a slot."""
+
+
+class Ticket:
+    def __init__(self, session_id, priority):
+        self.session_id = session_id
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.withdrawn = False
+
+
+class FairScheduler:
+    """Concurrency cap with per-session round-robin and two priorities."""
+
+    def __init__(self, max_concurrency, max_queue, bulk_max_wait=BULK_MAX_WAIT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.bulk_max_wait = bulk_max_wait
+        self.active = 0
+        self.waiting = 0
+        # priority -> session id -> that session's waiting tickets; dict order is the rotation
+        self._queues = {INTERACTIVE: OrderedDict(), BULK: OrderedDict()}
+        self._cond = threading.Condition()
+
+    def acquire(self, session_id=None, priority=INTERACTIVE):
+        """Block until the request may run and return its ticket for `release`.
+
+        Raises QueueFull when `max_queue` requests are already waiting, and
+        Withdrawn when the session withdraws its requests while this one waits.
+        """
+        ticket = Ticket(session_id, priority)
+        with self._cond:
+            if self.waiting >= self.max_queue:
+                raise QueueFull(f"{self.waiting} requests already waiting for Ollama")
+            self._queues[priority].setdefault(session_id, deque()).append(ticket)
+            self.waiting += 1
+            self._dispatch()
+            try:
+                while not ticket.granted and not ticket.withdrawn:
+                    self._cond.wait()
+            except BaseException:
+                if not ticket.granted and not ticket.withdrawn:
+                    self._remove(ticket)
+                    self._publish()
+                raise
+            if ticket.withdrawn:
+                raise Withdrawn(f"request from session {session_id} withdrawn")
+        get_recorder().observe(f"queue_wait_{PRIORITY_NAMES[priority]}", time.monotonic() - ticket.enqueued)
+        return ticket
+
+    def release(self, ticket):
+        with self._cond:
+            self.active -= 1
+            self._dispatch()
+        get_recorder().count(f"scheduler_completed_{PRIORITY_NAMES[ticket.priority]}_total")
+
+    @contextlib.contextmanager
+    def slot(self, session_id=None, priority=INTERACTIVE):
+        """Hold a slot for the duration of a request."""
+        ticket = self.acquire(session_id, priority)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def withdraw(self, session_id):
+        """Drop the session's waiting requests, e.g. when it cancels its reply."""
+        with self._cond:
+            withdrawn = 0
+            for sessions in self._queues.values():
+                for ticket in sessions.pop(session_id, ()):
+                    ticket.withdrawn = True
+                    withdrawn += 1
+            if withdrawn:
+                self.waiting -= withdrawn
+                self._cond.notify_all()
+                self._publish()
+        return withdrawn
+
+    def position(self, session_id):
+        """1-based place of the session's next waiting request in line, or None."""
+        with self._cond:
+            for place, ticket in enumerate(self._order(), 1):
+                if ticket.session_id == session_id:
+                    return place
+        return None
+
+    # Caller holds the lock for everything below ----------------------------
+
+    def _dispatch(self):
+        granted = False
+        while self.active < self.max_concurrency and self.waiting:
+            ticket = self._take(self._next_priority(time.monotonic()))
+            ticket.granted = True
+            self.active += 1
+            self.waiting -= 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+        self._publish()
+
+    def _next_priority(self, now):
+        bulk = self._queues[BULK]
+        if any(now - tickets[0].enqueued > self.bulk_max_wait for tickets in bulk.values()):
+            return BULK
+        return INTERACTIVE if self._queues[INTERACTIVE] else BULK
+
+    def _take(self, priority):
+        sessions = self._queues[priority]
+        session_id, tickets = next(iter(sessions.items()))
+        ticket = tickets.popleft()
+        if tickets:
+            sessions.move_to_end(session_id)  # Back of the rotation
+        else:
+            del sessions[session_id]
+        return ticket
+
+    def _remove(self, ticket):
+        sessions = self._queues[ticket.priority]
+        tickets = sessions[ticket.session_id]
+        tickets.remove(ticket)
+        if not tickets:
+            del sessions[ticket.session_id]
+        self.waiting -= 1
+
+    def _order(self):
+        # The order _dispatch would serve the current queue in, ignoring promotion
+        for priority in (INTERACTIVE, BULK):
+            rotation = [list(tickets) for tickets in self._queues[priority].values()]
+            while rotation:
+                for tickets in rotation:
+                    yield tickets.pop(0)
+                rotation = [tickets for tickets in rotation if tickets]
+
+    def _publish(self):
+        recorder = get_recorder()
+        recorder.gauge("scheduler_active", self.active)
+        recorder.gauge("scheduler_waiting", self.waiting)
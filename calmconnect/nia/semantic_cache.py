@@ -0,0 +1,161 @@
+"""Opt-in semantic cache for canned-style requests.
+
+Requests like "give me an affirmation", "guide me through a meditation" or
+"help me relax" come in over and over in slightly different words. With
+`NIA_SEMANTIC_CACHE=1`, such messages are embedded with a local Ollama
+embedding model and looked up in a cosine-similarity index; a close enough
+match is answered from the cache instead of running a full generation.
+
+Only short messages that ask for one of the CATEGORIES of canned content are
+ever cached. Messages that describe how someone feels ("I'm anxious", "I
+can't sleep") count as personal turns, like everything else, and always go
+to the model with the user's history; categories listed in
+`NIA_CACHE_OPT_OUT` are treated the same way. The cache is shared by every
+user, so cacheable replies are generated from the message alone, never from
+anyone's history. Each entry
+keeps up to `variants` replies and is only served from once it has them all,
+rotating through them so a user asking twice does not get the same text.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from nia.embeddings import EMBED_MODEL, embed
+from nia.tracing import get_recorder
+
+ENABLED = os.environ.get("NIA_SEMANTIC_CACHE", "0") == "1"
+THRESHOLD = float(os.environ.get("NIA_CACHE_THRESHOLD", "0.9"))
+VARIANTS = int(os.environ.get("NIA_CACHE_VARIANTS", "3"))
+CAPACITY = int(os.environ.get("NIA_CACHE_ENTRIES", "512"))
+OPT_OUT = {c.strip() for c in os.environ.get("NIA_CACHE_OPT_OUT", "").split(",") if c.strip()}
+MAX_PROMPT_CHARS = 60  # Longer messages carry personal detail
+
+# Category -> phrases that ask for canned content; never phrases describing a feeling
+CATEGORIES = {
+    "affirmation": ("affirmation", "positive quote", "motivational quote"),
+    "meditation": ("meditation", "meditate", "breathing exercise", "mindfulness exercise"),
+    "calm": ("relaxation exercise", "relaxation technique", "grounding exercise"),
+    "sleep": ("sleep story", "bedtime story", "sleep meditation"),
+}
+
+
+def categorize(text):
+    """Category of a canned-style message, or None for a personal turn."""
+    text = text.strip().lower()
+    if len(text) > MAX_PROMPT_CHARS:
+        return None
+    for category, phrases in CATEGORIES.items():
+        if any(phrase in text for phrase in phrases):
+            return category
+    return None
+
+
+class SemanticCache:
+    """Cosine-similarity index of replies to canned-style messages."""
+
+    def __init__(self, embed_model=EMBED_MODEL, threshold=THRESHOLD, variants=VARIANTS,
+                 capacity=CAPACITY, opt_out=OPT_OUT, enabled=ENABLED):
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.variants = variants
+        self.capacity = capacity
+        self.opt_out = set(opt_out)
+        self.enabled = enabled
+        self._vectors = None  # (capacity, dims) unit vectors, filled up to len(self._entries)
+        self._entries = []  # [category, replies, next variant, last used]
+        self._lock = threading.Lock()
+
+    def _category(self, text):
+        category = categorize(text)
+        return None if category in self.opt_out else category
+
+    def cacheable(self, text):
+        """Whether replies to `text` may be cached (and so must not use history)."""
+        return self.enabled and self._category(text) is not None
+
+    def _nearest(self, vector, category):
+        # Caller holds the lock
+        if not self._entries:
+            return None
+        scores = self._vectors[:len(self._entries)] @ vector
+        for row in np.argsort(scores)[::-1]:
+            if scores[row] < self.threshold:
+                return None
+            if self._entries[row][0] == category:
+                return row
+        return None
+
+    def lookup(self, text):
+        """A cached reply for `text`, or None."""
+        if not self.enabled:
+            return None
+        category = self._category(text)
+        if category is None:
+            return None
+        recorder = get_recorder()
+        try:
+            vector = embed(text, self.embed_model)
+        except Exception as e:
+            logging.error(f"Error embedding message for the response cache: {e}")
+            return None
+        with self._lock:
+            row = self._nearest(vector, category)
+            entry = self._entries[row] if row is not None else None
+            if entry is None or len(entry[1]) < self.variants:
+                recorder.count("semantic_cache_misses_total")
+                return None
+            reply = entry[1][entry[2] % len(entry[1])]
+            entry[2] += 1
+            entry[3] = time.monotonic()
+        recorder.count("semantic_cache_hits_total")
+        return reply
+
+    def store(self, text, reply):
+        """Remember `reply` as an answer to `text`, if `text` may be cached."""
+        if not self.enabled or not reply:
+            return
+        category = self._category(text)
+        if category is None:
+            return
+        try:
+            vector = embed(text, self.embed_model)
+        except Exception as e:
+            logging.error(f"Error embedding message for the response cache: {e}")
+            return
+        with self._lock:
+            row = self._nearest(vector, category)
+            if row is not None:
+                replies = self._entries[row][1]
+                if len(replies) < self.variants and reply not in replies:
+                    replies.append(reply)
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+            if len(self._entries) < self.capacity:
+                row = len(self._entries)
+                self._entries.append(None)
+            else:
+                # Full: reuse the least recently used row
+                row = min(range(len(self._entries)), key=lambda i: self._entries[i][3])
+            self._vectors[row] = vector
+            self._entries[row] = [category, [reply], 0, time.monotonic()]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache():
+    """Return the process-wide SemanticCache (disabled unless NIA_SEMANTIC_CACHE=1)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+        return _cache
@@ -0,0 +1,268 @@
+"""Streamlit session helpers shared by the apps: memory, model calls."""
+import logging
+import time
+import uuid
+
+import streamlit as st
+
+from nia.cancel import get_generations
+from nia.client import get_client
+from nia.inflight import get_inflight
+from nia.memory import open_session_store
+from nia.prompt import CHAT_OPTIONS, REPLY_TOKENS, build_messages, message_text
+from nia.recall import ENABLED as RECALL_ENABLED, RECALL_TOKENS, get_recall_index, recalled_message
+from nia.router import first_token_seconds, get_router
+from nia.semantic_cache import get_semantic_cache
+from nia.tracing import current_turn, detach_turn, ollama_stats, span
+from nia.worker import get_worker
+
+DEFAULT_USER = "default"
+CHAT_STORE = "chat_sessions"
+LEGACY_SHELVE = "chat_memory"
+POLL_INTERVAL = 0.25  # Seconds between polls of a streaming reply
+SETTLE_TIMEOUT = 5.0
+APOLOGY = "I'm sorry, but I couldn't process your request. Please try again."
+
+
+def current_user_id():
+    """Id of the user behind this Streamlit session.
+
+    Taken from `?user=` in the page URL; sessions without one share the
+    default user, which also owns the history imported from `chat_memory`.
+    """
+    if "user_id" not in st.session_state:
+        st.session_state.user_id = st.query_params.get("user") or DEFAULT_USER
+    return st.session_state.user_id
+
+
+def current_session_id():
+    """Id of this browser session, stable across reruns."""
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+
+def chat_log():
+    """This user's append-only chat log."""
+    return open_session_store(CHAT_STORE, legacy_shelve=LEGACY_SHELVE).log(current_user_id())
+
+
+def load_memory():
+    try:
+        with span("load_memory"):
+            messages = chat_log().load()
+    except Exception as e:
+        st.error(f"Error loading chat memory: {e}")
+        messages = []
+    st.session_state.saved_messages = len(messages)  # This session's part of the log
+    return messages
+
+
+def save_memory():
+    try:
+        with span("save_memory"):
+            log = chat_log()
+            stored = st.session_state.get("saved_messages", 0)
+            st.session_state.saved_messages = log.sync(st.session_state.messages, stored)
+        if RECALL_ENABLED:
+            get_recall_index(log.path).update(log)
+    except Exception as e:
+        st.error(f"Error saving chat memory: {e}")
+
+
+def context_messages(system_prompt, history):
+    """Budgeted recent history, plus relevant older turns when recall is on.
+
+    Recalled turns go right before the newest message, so the prefix of
+    the prompt stays the same from turn to turn.
+    """
+    if not RECALL_ENABLED:
+        return build_messages(system_prompt, history)
+    messages = build_messages(system_prompt, history, reserve=REPLY_TOKENS + RECALL_TOKENS)
+    kept = len(messages) - (1 if system_prompt else 0)
+    try:
+        with span("recall"):
+            recalled = recalled_message(get_recall_index(chat_log().path), history, kept)
+    except Exception as e:
+        logging.error(f"Error recalling older messages: {e}")
+        recalled = None
+    if recalled is not None:
+        messages.insert(len(messages) - 1, recalled)
+    return messages
+
+
+def cached_reply(history):
+    """(cacheable user text or None, cached reply or None) for the newest message.
+
+    A cacheable message that misses must be answered from the message alone,
+    since the reply will be served to other users.
+    """
+    cache = get_semantic_cache()
+    if not history or history[-1]["role"] != "user":
+        return None, None
+    text = message_text(history[-1])
+    if not cache.cacheable(text):
+        return None, None
+    with span("cache_lookup"):
+        return text, cache.lookup(text)
+
+
+def cancel_generation():
+    """Stop this session's running reply (Stop button, Clear Chat)."""
+    get_generations().cancel(current_session_id())
+
+
+def start_reply(model, system_prompt, on_text=None, on_finish=None):
+    """Start generating a reply to `st.session_state.messages` in the background.
+
+    Canned-style requests may be answered from the semantic cache. The
+    current trace is handed to the worker and finished there. `on_text` and
+    `on_finish` run on the worker thread, e.g. to feed speech. Show the reply
+    with `show_reply`.
+    """
+    history = st.session_state.messages
+    prompt, cached = cached_reply(history)
+    if cached is not None:
+        chunks = [{"message": {"role": "assistant", "content": cached}, "done": True}]
+    else:
+        model = get_router().route(model, message_text(history[-1]))
+        # Token-budgeted context: system prompt plus the newest messages
+        with span("build_prompt"):
+            if prompt is None:
+                messages = context_messages(system_prompt, history)
+            else:
+                # The reply goes into the shared cache, so it never sees this user's history
+                messages = build_messages(system_prompt, history[-1:])
+        chunks = get_client().chat(
+            model=model, messages=messages, options=CHAT_OPTIONS, stream=True, session_id=current_session_id(),
+        )
+    turn = detach_turn()
+
+    def finish(result):
+        # result is None when the generation failed; speech and the trace still end
+        if result is not None and cached is None and not result.cancelled:
+            get_router().observe(model, result.ttft)
+            if prompt is not None:
+                get_semantic_cache().store(prompt, result.text)
+        if on_finish is not None:
+            on_finish()
+        if turn is not None:
+            if result is not None:
+                turn.add_stream(result)
+            turn.finish()
+
+    return get_worker().submit(current_session_id(), chunks, finish, on_text)
+
+
+def collect_reply(buffer):
+    """Move a finished reply into the history and save it (once)."""
+    if buffer.collected:
+        return
+    buffer.collected = True
+    result = buffer.result
+    if result is not None and result.text.strip():
+        st.session_state.messages.append({"role": "assistant", "text": result.text.strip()})
+        save_memory()
+        st.session_state.setdefault("turn_stats", []).append(result.as_dict())
+
+
+def settle_reply(timeout=SETTLE_TIMEOUT):
+    """Cancel this session's running reply and move what it has into the history.
+
+    Call before changing `st.session_state.messages`, so a reply never lands
+    after the message that follows it. A reply still waiting for its first
+    token after `timeout` seconds is dropped.
+    """
+    buffer = get_worker().buffer(current_session_id())
+    if buffer is None:
+        return
+    cancel_generation()  # Also withdraws it from the queue, so a queued reply ends at once
+    buffer.finished.wait(timeout)
+    collect_reply(buffer)
+
+
+def show_reply(render, typing_speed=None, on_done=None):
+    """Show this session's reply while it streams; call right after the history.
+
+    `render(message)` draws one message, like the history does. `on_done(text)`
+    runs once the reply has been added to the history, e.g. to speak it.
+    """
+    worker = get_worker()
+    buffer = worker.buffer(current_session_id())
+    if buffer is None:
+        return
+    if buffer.collected:
+        worker.discard(current_session_id(), buffer)  # Already drawn with the history
+        if buffer.error is not None:
+            st.error("An error occurred while generating the response.")
+        return
+    _live_reply(buffer, render, typing_speed, on_done)
+
+
+@st.fragment(run_every=POLL_INTERVAL)
+def _live_reply(buffer, render, typing_speed, on_done):
+    # Reruns on its own every POLL_INTERVAL while the reply streams; the rest of the page stays put
+    buffer.poll()
+    if buffer.done and not buffer.collected:
+        collect_reply(buffer)
+        if on_done is not None and buffer.result is not None:
+            on_done(buffer.result.text)
+    text = buffer.text
+    if typing_speed and buffer.first_token_at is not None:
+        # Cosmetic "human typing": reveal no faster than typing_speed chars/sec
+        text = text[:int((time.monotonic() - buffer.first_token_at) * typing_speed) + 1]
+    if buffer.collected and (buffer.error is not None or text == buffer.text):
+        # One full rerun draws the reply with the history, and without this fragment its polling stops
+        st.rerun()
+    render({"role": "assistant", "text": text or "…"})
+    if not text and not buffer.done:
+        place = get_client().position(current_session_id())
+        if place is not None:
+            st.caption(f"Waiting for Nia — #{place} in line")
+    if not buffer.done:
+        st.button("⏹ Stop", key="stop_generation", on_click=cancel_generation)
+
+
+def generate_response(model, user_input):
+    """Generate AI response and update conversation history.
+
+    Submitting the message this session is still answering, or has just
+    answered (a double click), returns that reply instead of calling the
+    model again.
+    """
+    history = st.session_state.conversation_history
+
+    def generate():
+        history.append({"role": "user", "content": user_input})
+        turn = current_turn()
+        try:
+            prompt, ai_response = cached_reply(history)
+            if ai_response is None:
+                router = get_router()
+                routed = router.route(model, user_input)
+                with span("build_prompt"):
+                    # Bounded by num_ctx; replies for the shared cache see no history
+                    messages = build_messages(None, history if prompt is None else history[-1:])
+                started = time.perf_counter()
+                with span("generation"):
+                    response = get_client().chat(
+                        model=routed, messages=messages, options=CHAT_OPTIONS, session_id=current_session_id(),
+                    )
+                router.observe(routed, first_token_seconds(response, time.perf_counter() - started))
+                if turn is not None:
+                    turn.add_ollama(ollama_stats(response))
+                ai_response = response['message']['content']
+                if prompt is not None:
+                    get_semantic_cache().store(prompt, ai_response)
+        except Exception:
+            history.append({"role": "assistant", "content": APOLOGY})
+            raise
+        history.append({"role": "assistant", "content": ai_response})
+        return ai_response
+
+    try:
+        return get_inflight().run(current_session_id(), user_input, generate)[0]
+    except Exception as e:
+        st.error("An error occurred while generating the response.")
+        logging.error(f"Error generating response: {e}")
+        return APOLOGY
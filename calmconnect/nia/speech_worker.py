@@ -0,0 +1,148 @@
+"""Long-lived pyttsx3 speech worker.
+
+pyttsx3 engine startup and voice enumeration are paid once, in a separate
+process, instead of on every reply. Jobs go in through a queue and come back
+as WAV bytes on a Future, so the Streamlit script never blocks on
+`runAndWait()` and the browser plays the audio. Clips already in the audio
+cache skip the worker entirely.
+
+If the process fails to start its engine or dies, every pending Future fails
+with the reason, and the next `get_speech_worker()` starts a new process.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import Future
+
+from nia.audio_cache import get_audio_cache
+
+SPEECH_RATE = 200
+LIVENESS_INTERVAL = 1.0  # Seconds between checks that the worker process is still running
+
+
+def _voice_table(voices):
+    # Same choice as before: first installed voice is "Male", second is "Female"
+    table = {}
+    if len(voices) > 0:
+        table["Male"] = voices[0].id
+    if len(voices) > 1:
+        table["Female"] = voices[1].id
+    return table
+
+
+def _serve(jobs, results, rate):
+    try:
+        import pyttsx3
+
+        engine = pyttsx3.init()
+        engine.setProperty("rate", rate)
+        voices = _voice_table(engine.getProperty("voices"))
+    except Exception as e:
+        results.put((None, None, f"Speech engine failed to start: {e}"))
+        return
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, text, gender = job
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            if gender in voices:
+                engine.setProperty("voice", voices[gender])
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, "rb") as f:
+                results.put((job_id, f.read(), None))
+        except Exception as e:
+            results.put((job_id, None, str(e)))
+        finally:
+            os.remove(path)
+
+
+class SpeechWorker:
+    """Client side of the speech worker process."""
+
+    def __init__(self, rate=SPEECH_RATE):
+        # "spawn" keeps the child clear of the Streamlit server's threads
+        context = multiprocessing.get_context("spawn")
+        self._jobs = context.Queue()
+        self._results = context.Queue()
+        self._process = context.Process(target=_serve, args=(self._jobs, self._results, rate), daemon=True)
+        self._process.start()
+        self.rate = rate
+        self._ids = itertools.count()
+        self._pending = {}
+        self.failed = None  # Why the worker process stopped, once it has
+        self._lock = threading.Lock()
+        threading.Thread(target=self._collect, daemon=True).start()
+
+    def submit(self, text, gender="Female"):
+        """Queue `text` for synthesis; the Future resolves to WAV bytes."""
+        future = Future()
+        key = get_audio_cache().key(text, f"pyttsx3:{gender}", {"rate": self.rate})
+        audio = get_audio_cache().get(key)
+        if audio is not None:
+            future.set_result(audio)
+            return future
+        with self._lock:
+            if self.failed is not None:
+                future.set_exception(RuntimeError(self.failed))
+                return future
+            job_id = next(self._ids)
+            self._pending[job_id] = (future, key)
+        self._jobs.put((job_id, text, gender))
+        return future
+
+    def _collect(self):
+        while True:
+            try:
+                job_id, audio, error = self._results.get(timeout=LIVENESS_INTERVAL)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    self._fail(f"Speech worker exited with code {self._process.exitcode}")
+                    return
+                continue
+            if job_id is None:
+                self._fail(error)
+                return
+            with self._lock:
+                future, key = self._pending.pop(job_id, (None, None))
+            if future is None:
+                continue
+            if error is None:
+                try:
+                    get_audio_cache().put(key, audio)
+                except Exception as e:
+                    # The clip is still good; keep this thread alive for the next job
+                    logging.error(f"Error caching speech: {e}")
+                future.set_result(audio)
+            else:
+                logging.error(f"Error synthesizing speech: {error}")
+                future.set_exception(RuntimeError(error))
+
+    def _fail(self, reason):
+        # The process is gone: nothing will answer the pending jobs
+        logging.error(f"Error in speech worker: {reason}")
+        with self._lock:
+            self.failed = reason
+            pending, self._pending = self._pending, {}
+        for future, _ in pending.values():
+            future.set_exception(RuntimeError(reason))
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_speech_worker():
+    """Return the process-wide SpeechWorker, starting it on first use or after it failed."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or _worker.failed is not None:
+            _worker = SpeechWorker()
+        return _worker
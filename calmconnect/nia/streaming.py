@@ -0,0 +1,82 @@
+"""Read streamed model output into a reply buffer.
+
+Each piece of text is handed to the buffer as it arrives and the page draws
+the buffer at its own pace (see `nia.worker`), so reading the stream never
+waits for the UI and nothing ever sleeps before the first token.
+"""
+import time
+from dataclasses import dataclass, field
+
+from nia.tracing import ollama_stats
+
+
+@dataclass
+class StreamResult:
+    """Reply text and timings for one streamed turn."""
+
+    text: str
+    started: float
+    first_token_at: float
+    finished: float
+    tokens: int
+    stats: dict = field(default_factory=dict)  # Ollama's counts and durations
+    cancelled: bool = False  # Stopped before the model finished
+
+    @property
+    def ttft(self):
+        """Seconds until the first token arrived."""
+        return self.first_token_at - self.started
+
+    @property
+    def tokens_per_sec(self):
+        generating = self.finished - self.first_token_at
+        return self.tokens / generating if generating > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "ttft": round(self.ttft, 3),
+            "duration": round(self.finished - self.started, 3),
+            "tokens": self.tokens,
+            "tokens_per_sec": round(self.tokens_per_sec, 1),
+            "cancelled": self.cancelled,
+        }
+
+
+def read_stream(chunks, buffer, on_text=None):
+    """Feed an `ollama.chat(..., stream=True)` response into `buffer`.
+
+    Every new piece of text goes to `buffer.append` and to `on_text`, e.g. to
+    start speech before the reply is complete.
+
+    Returns a StreamResult with the full reply text and its timings.
+    """
+    begun = time.monotonic()
+    stats = {}
+    chunk_count = 0
+    parts = []
+    started = None
+
+    for chunk in chunks:
+        # The final chunk carries Ollama's own token counts and durations
+        if chunk.get("done"):
+            stats = ollama_stats(chunk)
+        piece = chunk["message"]["content"]
+        if not piece:
+            continue
+        if started is None:
+            started = time.monotonic()
+        chunk_count += 1
+        parts.append(piece)
+        buffer.append(piece)
+        if on_text is not None:
+            on_text(piece)
+
+    finished = time.monotonic()
+    return StreamResult(
+        text="".join(parts),
+        started=begun,
+        first_token_at=started if started is not None else finished,
+        finished=finished,
+        tokens=stats.get("eval_count") or chunk_count,
+        stats=stats,
+    )
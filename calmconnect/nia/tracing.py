@@ -0,0 +1,224 @@
+"""Per-turn latency tracing.
+
+Each stage of a turn (load_memory, build_prompt, ttft, generation, speak,
+save_memory, ...) is timed with `span()`. Timings go into a bounded
+in-memory window per stage for percentiles, and every finished turn is
+appended as one JSON line to `NIA_TRACE_LOG` together with Ollama's own
+token counts and durations. When `NIA_METRICS_PORT` is set, the recorder
+also serves the aggregates in Prometheus text format on `/metrics`, on
+localhost only unless `NIA_METRICS_HOST` says otherwise (e.g. `0.0.0.0` for a
+scraper on another machine).
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACE_LOG = os.environ.get("NIA_TRACE_LOG", "traces.jsonl")
+METRICS_PORT = os.environ.get("NIA_METRICS_PORT")
+METRICS_HOST = os.environ.get("NIA_METRICS_HOST", "127.0.0.1")
+WINDOW = 1000  # Samples kept per stage for percentiles
+
+# Fields of the final Ollama response worth keeping; durations are nanoseconds
+OLLAMA_FIELDS = (
+    "prompt_eval_count", "eval_count",
+    "total_duration", "load_duration", "prompt_eval_duration", "eval_duration",
+)
+
+
+def ollama_stats(response):
+    """Token counts and durations from a (final) Ollama response."""
+    return {field: response.get(field) for field in OLLAMA_FIELDS if response.get(field) is not None}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Recorder:
+    """Aggregates stage timings and counters for this process."""
+
+    def __init__(self, log_path=TRACE_LOG, window=WINDOW):
+        self.log_path = log_path
+        self.window = window
+        self._samples = {}  # stage -> deque of recent durations
+        self._totals = {}  # stage -> [count, sum]
+        self._counters = {}  # name -> value
+        self._gauges = {}  # name -> last value
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._totals[stage] = [0, 0.0]
+            samples.append(seconds)
+            self._totals[stage][0] += 1
+            self._totals[stage][1] += seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def gauges(self):
+        with self._lock:
+            return dict(self._gauges)
+
+    def quantile(self, stage, q):
+        """`q` quantile of the recent window for `stage`, and how many samples it holds."""
+        with self._lock:
+            samples = list(self._samples.get(stage, ()))
+        return percentile(samples, q), len(samples)
+
+    def summary(self):
+        """{stage: {"count", "p50", "p95"}} over the recent window."""
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+            totals = {stage: list(total) for stage, total in self._totals.items()}
+        return {
+            stage: {"count": totals[stage][0], "p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+            for stage, values in samples.items()
+        }
+
+    def write(self, record):
+        if not self.log_path:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def prometheus(self):
+        """Current metrics in Prometheus text exposition format."""
+        lines = ["# TYPE nia_stage_seconds summary"]
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+            totals = {stage: list(total) for stage, total in self._totals.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        for stage, values in sorted(samples.items()):
+            for q in (0.5, 0.95):
+                lines.append(f'nia_stage_seconds{{stage="{stage}",quantile="{q}"}} {percentile(values, q):.6f}')
+            lines.append(f'nia_stage_seconds_count{{stage="{stage}"}} {totals[stage][0]}')
+            lines.append(f'nia_stage_seconds_sum{{stage="{stage}"}} {totals[stage][1]:.6f}')
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE nia_{name} counter")
+            lines.append(f"nia_{name} {value}")
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE nia_{name} gauge")
+            lines.append(f"nia_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Turn:
+    """Spans and Ollama stats for one chat turn."""
+
+    def __init__(self, recorder, app):
+        self.recorder = recorder
+        self.record = {"ts": time.time(), "app": app, "spans": {}}
+
+    def add_span(self, stage, seconds):
+        spans = self.record["spans"]
+        spans[stage] = round(spans.get(stage, 0.0) + seconds, 6)  # save_memory runs twice per turn
+
+    def add_stream(self, result):
+        """Record a StreamResult: time to first token, generation time and Ollama stats."""
+        for stage, seconds in (("ttft", result.ttft), ("generation", result.finished - result.first_token_at)):
+            self.recorder.observe(stage, seconds)
+            self.add_span(stage, seconds)
+        self.add_ollama(result.stats)
+
+    def add_ollama(self, stats):
+        self.record["ollama"] = stats
+        for field in ("prompt_eval_count", "eval_count"):
+            if field in stats:
+                self.recorder.count(f"ollama_{field}_total", stats[field])
+
+    def finish(self):
+        _current.turn = None
+        self.recorder.write(self.record)
+
+
+_current = threading.local()  # Streamlit runs each session's script on its own thread
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """Return the process-wide Recorder, starting the metrics endpoint if configured."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = Recorder()
+            if METRICS_PORT:
+                _serve_metrics(_recorder, METRICS_HOST, int(METRICS_PORT))
+        return _recorder
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time a stage, adding it to the current turn if there is one."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        get_recorder().observe(stage, seconds)
+        turn = current_turn()
+        if turn is not None:
+            turn.add_span(stage, seconds)
+
+
+def current_turn():
+    """The turn being traced on this thread, or None."""
+    return getattr(_current, "turn", None)
+
+
+def detach_turn():
+    """Stop tracing on this thread and return the turn, e.g. to finish it on a worker."""
+    turn = current_turn()
+    _current.turn = None
+    return turn
+
+
+def start_turn(app):
+    """Start tracing a turn on this thread; call `finish()` when it is done."""
+    _current.turn = Turn(get_recorder(), app)
+    return _current.turn
+
+
+def _serve_metrics(recorder, host, port):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = recorder.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logging.error(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
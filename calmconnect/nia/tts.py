@@ -0,0 +1,109 @@
+"""Sentence-pipelined text to speech.
+
+Text is cut into sentences while the reply is still streaming. A background
+worker synthesizes each sentence as soon as it is complete and hands the
+audio to a process-wide player, so speech starts after the first sentence
+and the Streamlit script never waits for synthesis or playback. Audio stays
+in memory the whole way; nothing is written to a shared temp file.
+"""
+import logging
+import queue
+import re
+import threading
+
+SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*\s+")
+MIN_SENTENCE = 12  # Shorter fragments ("Oh!") are merged into the next sentence
+
+
+class SentenceSplitter:
+    """Accumulates streamed text and yields complete sentences."""
+
+    def __init__(self, min_length=MIN_SENTENCE):
+        self.min_length = min_length
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            sentence = self._buffer[start:match.end()].strip()
+            if len(sentence) >= self.min_length:
+                sentences.append(sentence)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest
+
+
+class AudioPlayer:
+    """Plays audio clips one after another on a background thread."""
+
+    def __init__(self, play):
+        self._play = play  # Blocking function that plays one clip
+        self._clips = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def play(self, audio):
+        self._clips.put(audio)
+
+    def _run(self):
+        while True:
+            audio = self._clips.get()
+            try:
+                self._play(audio)
+            except Exception as e:
+                logging.error(f"Error playing audio: {e}")
+
+
+class SpeechPipeline:
+    """Synthesizes one reply sentence by sentence while it streams in."""
+
+    def __init__(self, synthesize, player):
+        self._splitter = SentenceSplitter()
+        self._sentences = queue.Queue()
+        self._player = player
+        self.error = None  # First synthesis error, for the page to show
+        threading.Thread(target=self._run, args=(synthesize,), daemon=True).start()
+
+    def feed(self, text):
+        """Pass the next piece of streamed text."""
+        for sentence in self._splitter.feed(text):
+            self._sentences.put(sentence)
+
+    def finish(self):
+        """Speak whatever is left once the stream is done."""
+        rest = self._splitter.flush()
+        if rest:
+            self._sentences.put(rest)
+        self._sentences.put(None)
+
+    def _run(self, synthesize):
+        while True:
+            sentence = self._sentences.get()
+            if sentence is None:
+                return
+            try:
+                audio = synthesize(sentence)
+            except Exception as e:
+                logging.error(f"Error synthesizing speech: {e}")
+                if self.error is None:
+                    self.error = e
+                continue
+            self._player.play(audio)
+
+
+_player = None
+_player_lock = threading.Lock()
+
+
+def get_player(play):
+    """Return the process-wide AudioPlayer; `play` is only used the first time."""
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = AudioPlayer(play)
+        return _player
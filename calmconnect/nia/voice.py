@@ -0,0 +1,135 @@
+"""Voice output and input for the apps.
+
+The voice backends (elevenlabs, pygame, pyttsx3, speech_recognition) are
+heavy to import and initialize, so nothing here touches them until voice is
+actually used: importing this module costs no more than the text-only path.
+"""
+import io
+import threading
+import time
+
+import streamlit as st
+
+from nia.audio_cache import get_audio_cache
+from nia.speech_worker import get_speech_worker
+from nia.tts import SpeechPipeline, get_player
+
+ELEVENLABS_VOICES = {
+    "Female": "EXAVITQu4vr4xnSDxMaL",  # Bella
+    "Male": "TxGEqnHWrfWFTfGW9XjX",  # Josh
+}
+VOICE_OPTIONS = {"stability": 0.5, "similarity_boost": 0.8}
+
+_elevenlabs_key = None
+_mixer_lock = threading.Lock()
+
+
+# 🔊 pyttsx3 voice (speech worker process, played in the browser)
+
+def speak(text):
+    if not st.session_state.voice_enabled:
+        return
+    # Synthesized by the speech worker process; play_speech() plays it once ready
+    st.session_state.speech = get_speech_worker().submit(text, st.session_state.voice_gender)
+    st.rerun()  # Called from the reply fragment; the full run starts play_speech's polling
+
+
+def play_speech():
+    """Play this session's synthesized reply once, polling only while it is pending."""
+    speech = st.session_state.get("speech")
+    if speech is None:
+        return
+    if not speech.done():
+        _wait_for_speech(speech)
+        return
+    st.session_state.speech = None  # Emitted once; later reruns don't play it again
+    try:
+        st.audio(speech.result(), format="audio/wav", autoplay=True)
+    except Exception as e:
+        st.error(f"Voice Error: {e}")
+
+
+@st.fragment(run_every=0.5)
+def _wait_for_speech(speech):
+    if speech.done():
+        st.rerun()  # play_speech() emits the audio in the full run
+
+
+# 🔊 ElevenLabs voice (sentence-pipelined, played on this machine)
+
+def _play_mp3(audio):
+    # Runs on the player thread, so waiting for playback never blocks the chat
+    import pygame
+
+    with _mixer_lock:
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+    pygame.mixer.music.load(io.BytesIO(audio), "mp3")
+    pygame.mixer.music.play()
+    while pygame.mixer.music.get_busy():
+        time.sleep(0.1)
+
+
+def start_elevenlabs_speech(api_key):
+    """Return a SpeechPipeline for the next reply, or None when voice is off.
+
+    When ElevenLabs can't be set up, shows a Voice Error and returns None, so
+    the reply still comes as text.
+    """
+    global _elevenlabs_key
+    if not st.session_state.voice_enabled:
+        return None
+    try:
+        from elevenlabs import Voice, VoiceSettings, generate, set_api_key
+
+        if _elevenlabs_key != api_key:
+            set_api_key(api_key)
+            _elevenlabs_key = api_key
+    except Exception as e:
+        st.error(f"Voice Error: {e}")
+        return None
+    voice_id = ELEVENLABS_VOICES.get(st.session_state.voice_gender, ELEVENLABS_VOICES["Female"])
+
+    def synthesize(sentence):
+        # Repeated sentences come from the audio cache and cost no API quota
+        key = get_audio_cache().key(sentence, voice_id, VOICE_OPTIONS)
+        return get_audio_cache().get_or_create(
+            key, lambda: generate(text=sentence, voice=Voice(voice_id=voice_id, settings=VoiceSettings(**VOICE_OPTIONS)))
+        )
+
+    pipeline = SpeechPipeline(synthesize, get_player(_play_mp3))
+    st.session_state.elevenlabs_speech = pipeline  # show_speech_error() reports its failures
+    return pipeline
+
+
+def show_speech_error():
+    """Show a Voice Error once if the last reply's speech failed to synthesize."""
+    pipeline = st.session_state.get("elevenlabs_speech")
+    if pipeline is not None and pipeline.error is not None:
+        st.session_state.elevenlabs_speech = None
+        st.error(f"Voice Error: {pipeline.error}")
+
+
+# 🎤 Voice input
+
+def get_voice_input():
+    import speech_recognition as sr
+    from nia.listen import VoiceInput
+
+    if "voice_listener" not in st.session_state:
+        st.session_state.voice_listener = VoiceInput()  # Calibrates once per session
+    st.write("🎤 Listening...")
+    transcript = st.empty()
+    text = None
+    try:
+        # Partial transcripts appear as each chunk of speech is recognized
+        for text in st.session_state.voice_listener.listen():
+            transcript.write(f"🗣 You: {text}")
+        return text
+    except sr.UnknownValueError:
+        st.error("😕 Couldn't understand. Try again.")
+    except sr.RequestError:
+        st.error("⚠ Voice service unavailable.")
+    except sr.WaitTimeoutError:
+        st.error("⏳ No speech detected.")
+    return None
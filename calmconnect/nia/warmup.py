@@ -0,0 +1,86 @@
+"""Model warm-up and keep-alive.
+
+The first request after Ollama unloads a model pays the full load time. Each
+process preloads the model once at startup (an empty generate request loads
+it without producing output) and then probes the server periodically,
+reloading the model if it was evicted anyway.
+"""
+import logging
+import os
+import threading
+import time
+
+from nia.client import get_client
+from nia.prompt import CHAT_OPTIONS
+from nia.scheduler import BULK
+
+PROBE_INTERVAL = float(os.environ.get("NIA_PROBE_INTERVAL", "60"))
+
+COLD = "cold"
+WARMING = "warming"
+READY = "ready"
+ERROR = "error"
+
+
+class ModelWarmer:
+    """Keeps one model loaded on the Ollama server."""
+
+    def __init__(self, model, probe_interval=PROBE_INTERVAL):
+        self.model = model
+        self.probe_interval = probe_interval
+        self.state = COLD
+        self.error = None
+        self.load_time = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                if not self.ready or not self._loaded():
+                    self._load()
+            except Exception as e:
+                self.state = ERROR
+                self.error = str(e)
+                logging.error(f"Error warming up {self.model}: {e}")
+            time.sleep(self.probe_interval)
+
+    def _load(self):
+        self.state = WARMING
+        started = time.monotonic()
+        # keep_alive is filled in by the shared client; loading waits behind chat turns
+        get_client().generate(
+            model=self.model, prompt="", options=CHAT_OPTIONS, session_id=f"warmup:{self.model}", priority=BULK,
+        )
+        self.load_time = time.monotonic() - started
+        self.state = READY
+        self.error = None
+
+    def _loaded(self):
+        # Lightweight probe: list the running models, bypassing the request queue
+        running = get_client().client.ps()
+        return any(m.model == self.model or m.name == self.model for m in running.models)
+
+
+_warmers = {}
+_warmers_lock = threading.Lock()
+
+
+def ensure_warm(model):
+    """Start keeping `model` warm (once per process) and return its ModelWarmer."""
+    with _warmers_lock:
+        warmer = _warmers.get(model)
+        if warmer is None:
+            warmer = _warmers[model] = ModelWarmer(model)
+    warmer.start()
+    return warmer
@@ -0,0 +1,128 @@
+"""Background reply generation.
+
+Replies are generated on worker threads instead of the Streamlit script
+thread. Tokens go into a per-session ReplyBuffer that the page polls from a
+fragment, so widgets stay responsive while a long reply streams and a
+finished reply costs no full-page rerun.
+
+A session that stops polling for `ABANDON_AFTER` seconds (the tab was
+closed) has its generation cancelled, so nobody's reply keeps the server
+busy after they are gone. Finished replies nobody has polled for
+`EVICT_AFTER` seconds are dropped, so closed tabs don't keep their last
+reply in memory.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from nia.cancel import get_generations
+from nia.client import MAX_CONCURRENCY, MAX_QUEUE
+from nia.streaming import read_stream
+
+ABANDON_AFTER = 10.0  # Seconds without a poll before a reply is cancelled
+EVICT_AFTER = 300.0  # Seconds without a poll before a finished reply is dropped
+
+
+class ReplyBuffer:
+    """Text of one reply as it streams in; `read_stream` appends to it."""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self._parts = []
+        self.first_token_at = None
+        self.result = None  # StreamResult once finished
+        self.error = None
+        self.collected = False  # Moved into the session's history
+        self.finished = threading.Event()
+        self.last_poll = time.monotonic()
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    @property
+    def text(self):
+        # Joined when the page polls, not for every chunk
+        return "".join(self._parts)
+
+    def append(self, piece):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self._parts.append(piece)
+        if time.monotonic() - self.last_poll > ABANDON_AFTER:
+            self.generation.cancel()
+
+    def poll(self):
+        """Mark the reply as still watched."""
+        self.last_poll = time.monotonic()
+
+
+class GenerationWorker:
+    """Thread pool that streams replies into per-session buffers."""
+
+    def __init__(self, max_workers=MAX_CONCURRENCY + MAX_QUEUE):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="nia-generate")
+        self._buffers = {}  # session id -> latest ReplyBuffer
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, chunks, finish=None, on_text=None):
+        """Stream `chunks` into a new buffer for the session.
+
+        `finish(result)` is called on the worker thread once the reply is
+        complete or cancelled, e.g. to save it, and with None if it failed, so
+        cleanup always runs. Starting a reply cancels the session's previous
+        one.
+        """
+        buffer = ReplyBuffer(get_generations().start(session_id, chunks))
+        with self._lock:
+            self._evict(time.monotonic())
+            self._buffers[session_id] = buffer
+        self._executor.submit(self._run, buffer, finish, on_text)
+        return buffer
+
+    def _run(self, buffer, finish, on_text):
+        generation = buffer.generation
+        try:
+            buffer.result = read_stream(generation, buffer, on_text=on_text)
+            buffer.result.cancelled = generation.cancelled
+        except Exception as e:
+            buffer.error = e
+            logging.error(f"Error generating response: {e}")
+        finally:
+            generation.close()
+            try:
+                if finish is not None:
+                    finish(buffer.result)
+            except Exception as e:
+                logging.error(f"Error finishing response: {e}")
+            buffer.finished.set()
+
+    def buffer(self, session_id):
+        with self._lock:
+            return self._buffers.get(session_id)
+
+    def _evict(self, now):
+        # Caller holds the lock; sessions still watching their reply poll it
+        for session_id, buffer in list(self._buffers.items()):
+            if buffer.done and now - buffer.last_poll > EVICT_AFTER:
+                del self._buffers[session_id]
+
+    def discard(self, session_id, buffer):
+        """Forget `buffer` once its reply is in the session's history."""
+        with self._lock:
+            if self._buffers.get(session_id) is buffer:
+                del self._buffers[session_id]
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """Return the process-wide GenerationWorker."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = GenerationWorker()
+        return _worker
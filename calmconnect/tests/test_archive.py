@@ -0,0 +1,114 @@
+"""Export, import and convert round trips of chat history archives."""
+import gzip
+import os
+import shelve
+import threading
+
+import pytest
+
+from nia import archive
+from nia.archive import ArchiveError, convert_shelve, export_store, import_archive, iter_archive, iter_records
+from nia.memory import SessionStore
+
+
+def history(user, count):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "text": f"{user} {i}"} for i in range(count)]
+
+
+def leftovers(root):
+    return [name for _, _, names in os.walk(root) for name in names if name.endswith(".tmp")]
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(archive, "IMPORT_BATCH", 7)
+
+
+def test_export_then_import_restores_every_log(tmp_path, small_batches):
+    source = SessionStore(str(tmp_path / "source"))
+    users = {"alice": 25, "bob": 3, "carol": 0}
+    for user, count in users.items():
+        source.log(user).append(*history(user, count))
+    path = str(tmp_path / "backup.nia")
+
+    assert export_store(source.root, path) == (3, 28)  # carol's log is empty
+
+    target = SessionStore(str(tmp_path / "target"))
+    target.log("alice").append({"role": "user", "text": "replaced by the import"})
+    threads = threading.active_count()
+    assert import_archive(path, target.root) == (3, 28)
+
+    assert threading.active_count() == threads  # Compacted in place, no background work
+    assert leftovers(target.root) == []
+    fresh = SessionStore(target.root)
+    assert fresh.log("alice").load() == history("alice", 25)
+    assert fresh.log("bob").load() == history("bob", 3)
+    assert fresh.log("carol").load() == []
+
+
+def test_import_leaves_one_compacted_segment(tmp_path, small_batches):
+    source = SessionStore(str(tmp_path / "source"))
+    source.log("alice").append(*history("alice", 30))
+    path = str(tmp_path / "backup.nia")
+    export_store(source.root, path)
+
+    root = str(tmp_path / "target")
+    for _ in range(2):  # Importing twice replaces the history instead of adding to it
+        import_archive(path, root)
+
+    log = SessionStore(root).log("alice")
+    sealed = log._segments()[:-1]
+    assert len(sealed) == 1
+    assert log.load() == history("alice", 30)
+
+
+def test_convert_shelve_then_import(tmp_path):
+    shelve_path = str(tmp_path / "chat_memory")
+    with shelve.open(shelve_path) as db:
+        db["messages"] = history("old", 12)
+    root = str(tmp_path / "chat_sessions")
+    path = str(tmp_path / "converted.nia")
+
+    assert convert_shelve(shelve_path, path, root, user_id="dana") == 12
+    assert [message for _, message in iter_archive(path)] == history("old", 12)
+
+    assert import_archive(path, root) == (1, 12)
+    assert SessionStore(root).log("dana").load() == history("old", 12)
+
+
+def test_truncated_archive_is_rejected(tmp_path):
+    source = SessionStore(str(tmp_path / "source"))
+    source.log("alice").append(*history("alice", 5))
+    path = str(tmp_path / "backup.nia")
+    export_store(source.root, path)
+    with gzip.open(path, "rb") as f:
+        data = f.read()
+    with gzip.open(path, "wb") as f:
+        f.write(data[:-3])
+
+    with pytest.raises(ArchiveError):
+        list(iter_archive(path))
+
+
+def test_archive_cut_short_on_disk_leaves_the_store_alone(tmp_path, small_batches):
+    source = SessionStore(str(tmp_path / "source"))
+    source.log("alice").append(*history("alice", 3000))
+    path = str(tmp_path / "backup.nia")
+    export_store(source.root, path)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+
+    target = SessionStore(str(tmp_path / "target"))
+    target.log("alice").append(*history("mine", 5))
+    with pytest.raises(ArchiveError):
+        import_archive(path, target.root)
+    assert SessionStore(target.root).log("alice").load() == history("mine", 5)
+
+
+def test_file_that_is_not_gzip_is_rejected(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not an archive")
+    with pytest.raises(ArchiveError):
+        list(iter_records(str(path)))
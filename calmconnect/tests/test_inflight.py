@@ -0,0 +1,67 @@
+"""Coalescing repeated submits of the same message."""
+import threading
+
+import pytest
+
+from nia.inflight import InFlightRegistry
+
+
+class Model:
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return f"reply {self.calls}"
+
+
+def test_repeat_while_generating_attaches():
+    registry, model = InFlightRegistry(), Model()
+    model.release.clear()
+    first = []
+    thread = threading.Thread(target=lambda: first.append(registry.run("s", "hi", model.generate)))
+    thread.start()
+    model.started.wait(5)
+    model.release.set()
+    assert registry.run("s", "hi", model.generate) == ("reply 1", True)
+    thread.join()
+    assert first == [("reply 1", False)]
+    assert model.calls == 1
+
+
+def test_double_click_right_after_the_reply_attaches():
+    # The second click's rerun only starts once the first run is over
+    registry, model = InFlightRegistry(), Model()
+    assert registry.run("s", "hi", model.generate) == ("reply 1", False)
+    assert registry.run("s", "hi", model.generate) == ("reply 1", True)
+    assert model.calls == 1
+
+
+def test_same_text_later_is_a_new_turn():
+    registry, model = InFlightRegistry(repeat_window=0), Model()
+    registry.run("s", "ok", model.generate)
+    assert registry.run("s", "ok", model.generate) == ("reply 2", False)
+
+
+def test_other_message_or_session_is_a_new_turn():
+    registry, model = InFlightRegistry(), Model()
+    registry.run("s", "hi", model.generate)
+    assert registry.run("s", "hello", model.generate)[1] is False
+    assert registry.run("t", "hello", model.generate)[1] is False
+    assert model.calls == 3
+
+
+def test_failed_generation_can_be_retried():
+    registry, model = InFlightRegistry(), Model()
+
+    def fail():
+        raise RuntimeError("Ollama is down")
+
+    with pytest.raises(RuntimeError):
+        registry.run("s", "hi", fail)
+    assert registry.run("s", "hi", model.generate) == ("reply 1", False)
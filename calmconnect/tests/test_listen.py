@@ -0,0 +1,73 @@
+"""Chunked transcription of recorded WAV files, without a real recognizer."""
+import math
+import struct
+import wave
+
+import pytest
+import speech_recognition as sr
+
+from nia.listen import CHUNK_SECONDS, VoiceInput
+
+RATE = 16000
+
+
+def write_wav(path, segments):
+    """Write (seconds, loud) segments: a steady tone for speech, faint noise otherwise."""
+    frames = bytearray()
+    for seconds, loud in segments:
+        for i in range(int(seconds * RATE)):
+            sample = int(8000 * math.sin(2 * math.pi * 220 * i / RATE)) if loud else (i % 7) - 3
+            frames += struct.pack("<h", sample)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes(bytes(frames))
+    return str(path)
+
+
+@pytest.fixture
+def voice():
+    voice = VoiceInput(backend="google")
+    # Each chunk is "transcribed" as its length, so tests can see how audio was cut
+    voice.recognize = lambda audio: f"{len(audio.frame_data) / audio.sample_width / audio.sample_rate:.1f}"
+    return voice
+
+
+def chunk_lengths(voice, path):
+    with sr.AudioFile(path) as source:
+        partials = list(voice.transcribe_chunks(source, live=False))
+    return partials, [float(length) for length in partials[-1].split()]
+
+
+def test_long_speech_is_cut_into_chunks_with_partials(voice, tmp_path):
+    path = write_wav(tmp_path / "long.wav", [(0.3, False), (6, True), (2, False)])
+    partials, lengths = chunk_lengths(voice, path)
+    assert len(partials) == 2  # A partial transcript after each chunk
+    assert lengths[0] >= CHUNK_SECONDS
+    assert sum(lengths) >= 6
+
+
+def test_short_pause_does_not_end_the_utterance(voice, tmp_path):
+    path = write_wav(tmp_path / "pause.wav", [(0.3, False), (1, True), (0.4, False), (1, True), (2, False)])
+    partials, lengths = chunk_lengths(voice, path)
+    assert len(lengths) == 1
+    assert lengths[0] >= 2.4
+
+
+def test_long_pause_ends_the_utterance(voice, tmp_path):
+    path = write_wav(tmp_path / "stop.wav", [(0.3, False), (1, True), (2, False), (1, True), (1, False)])
+    partials, lengths = chunk_lengths(voice, path)
+    assert len(lengths) == 1
+    assert lengths[0] < 2.5  # The speech after the pause is not part of it
+
+
+def test_silence_times_out(voice, tmp_path):
+    path = write_wav(tmp_path / "silence.wav", [(5, False)])
+    with pytest.raises(sr.WaitTimeoutError):
+        chunk_lengths(voice, path)
+
+
+def test_transcribe_file_returns_the_full_text(voice, tmp_path):
+    path = write_wav(tmp_path / "file.wav", [(0.3, False), (1, True), (1, False)])
+    assert float(voice.transcribe_file(path)) >= 1
@@ -0,0 +1,67 @@
+"""Append-only chat logs shared by several writers."""
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from nia.memory import ChatLog
+
+APPENDS = 300
+SEGMENT_BYTES = 2000  # Tiny segments, so writers roll over and compact constantly
+
+
+def append_many(path, writer, appends=APPENDS):
+    log = ChatLog(path, segment_bytes=SEGMENT_BYTES, compact_after=2)
+    for i in range(appends):
+        log.append({"role": "user", "text": f"{writer} {i}"})
+    settle(log)
+
+
+def settle(log):
+    # Wait for this instance's background compaction, then fold what is left
+    while log._compacting:
+        time.sleep(0.01)
+    log.compact()
+
+
+def check(path, writers):
+    messages = ChatLog(path).load()
+    assert len(messages) == APPENDS * len(writers)
+    for writer in writers:
+        texts = [m["text"] for m in messages if m["text"].startswith(f"{writer} ")]
+        assert texts == [f"{writer} {i}" for i in range(APPENDS)]  # Each writer's order survives
+    assert [name for name in os.listdir(path) if name.endswith(".tmp")] == []
+
+
+def test_two_instances_in_one_process(tmp_path):
+    path = str(tmp_path / "log")
+    threads = [threading.Thread(target=append_many, args=(path, writer)) for writer in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    check(path, "ab")
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_two_processes(tmp_path):
+    path = str(tmp_path / "log")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=append_many, args=(path, writer)) for writer in "ab"]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        process.kill()  # A writer stuck behind a broken lock fails the test instead of hanging it
+    assert [process.exitcode for process in processes] == [0, 0]
+    check(path, "ab")
+
+
+def test_sync_rewrites_a_cleared_history(tmp_path):
+    log = ChatLog(str(tmp_path / "log"))
+    messages = [{"role": "user", "text": str(i)} for i in range(5)]
+    stored = log.sync(messages, 0)
+    assert log.sync(messages[:2], stored) == 2
+    assert log.load() == messages[:2]
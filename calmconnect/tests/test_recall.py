@@ -0,0 +1,84 @@
+"""Recall index kept in step with a chat log shared by several sessions."""
+import time
+import zlib
+
+import numpy as np
+import pytest
+
+from nia import recall
+from nia.memory import ChatLog
+from nia.recall import RecallIndex, recalled_message
+
+DIMS = 64
+
+
+def fake_embed_many(texts, model=None):
+    # Bag of words hashed into DIMS buckets: shared words mean similar vectors
+    vectors = np.zeros((len(texts), DIMS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, zlib.crc32(word.encode()) % DIMS] += 1
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+@pytest.fixture(autouse=True)
+def no_ollama(monkeypatch):
+    monkeypatch.setattr(recall, "embed_many", fake_embed_many)
+    monkeypatch.setattr(recall, "embed", lambda text, model=None: fake_embed_many([text])[0])
+
+
+def caught_up(index, log):
+    index.update(log)
+    while index._running:
+        time.sleep(0.01)
+    return [m["text"] for m in index._messages]
+
+
+def turn(topic, i):
+    return [{"role": "user", "text": f"{topic} question {i}"}, {"role": "assistant", "text": f"{topic} answer {i}"}]
+
+
+def test_sessions_saving_in_turn_keep_the_log_order(tmp_path):
+    log = ChatLog(str(tmp_path / "log"))
+    index = RecallIndex(str(tmp_path / "log"))
+    sessions = {"a": ([], 0), "b": ([], 0)}
+    for i in range(6):
+        for name, topic in (("a", "garden"), ("b", "piano")):
+            messages, stored = sessions[name]
+            messages.extend(turn(topic, i))
+            sessions[name] = (messages, log.sync(messages, stored))
+            caught_up(index, log)
+
+    # One row per message of the log, in the log's order, never rebuilt from a session's list
+    assert caught_up(index, log) == [m["text"] for m in log.load()]
+    assert len(index) == 24
+
+
+def test_recalled_turns_come_from_the_log_not_the_session(tmp_path):
+    log = ChatLog(str(tmp_path / "log"))
+    index = RecallIndex(str(tmp_path / "log"))
+    piano = turn("piano", 0)
+    log.append(*piano)
+    mine = turn("garden", 1) + [{"role": "user", "text": "piano question again"}]
+    log.append(*mine)
+    caught_up(index, log)
+
+    message = recalled_message(index, mine, kept=1)
+    assert "user: piano question 0\nassistant: piano answer 0" in message["content"]
+    assert "piano question again" not in message["content"]  # Already in the prompt
+
+
+def test_clear_starts_the_index_over(tmp_path):
+    log = ChatLog(str(tmp_path / "log"))
+    index = RecallIndex(str(tmp_path / "log"))
+    messages = turn("garden", 0) + turn("garden", 1)
+    log.sync(messages, 0)
+    caught_up(index, log)
+
+    fresh = turn("piano", 0) + turn("piano", 1) + turn("piano", 2)
+    log.clear()
+    log.sync(fresh, 0)
+    assert caught_up(index, log) == [m["text"] for m in fresh]
+
+    reopened = RecallIndex(str(tmp_path / "log"))  # Rows and their messages survive a restart
+    assert caught_up(reopened, log) == [m["text"] for m in fresh]
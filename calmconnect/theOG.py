@@ -1,6 +1,10 @@
 import streamlit as st
-import ollama
-import logging
+from nia.assets import apply_style
+from nia.pool import get_response_pool
+from nia.render import debug_panel, render_history, warmup_notice
+from nia.session import generate_response
+from nia.tracing import start_turn
+from nia.warmup import ensure_warm
 
 # Set page configuration
 st.set_page_config(page_title="Emotional Support Agent", page_icon="🧠", layout="wide")
@@ -12,26 +16,14 @@ if "conversation_history" not in st.session_state:
 # Model to use
 MODEL_NAME = "mistral:latest"
 
-# Function to generate AI responses
-def generate_response(user_input):
-    """Generate AI response and update conversation history."""
-    st.session_state.conversation_history.append({"role": "user", "content": user_input})
-
-    try:
-        # Generate AI response
-        response = ollama.chat(model=MODEL_NAME, messages=st.session_state.conversation_history)
-        ai_response = response['message']['content']
-    except Exception as e:
-        ai_response = "I'm sorry, but I couldn't process your request. Please try again."
-        st.error("An error occurred while generating the response.")
-        logging.error(f"Error generating response: {e}")
-
-    st.session_state.conversation_history.append({"role": "assistant", "content": ai_response})
-    return ai_response
+# Fixed prompts behind the feature buttons, served from a pre-generated pool
+AFFIRMATION_PROMPT = "Give me a positive affirmation."
+MEDITATION_PROMPT = "Give me a guided meditation."
+response_pool = get_response_pool(MODEL_NAME)
+response_pool.warm(AFFIRMATION_PROMPT, MEDITATION_PROMPT)
 
 # Styling for card-like design
-st.markdown("""
-    <style>
+apply_style("""
     body {
         font-family: 'Arial', sans-serif;
         background-color: #F9F9F9;
@@ -67,44 +59,53 @@ st.markdown("""
     .stButton:hover {
         background-color: #3F7A91;
     }
-    </style>
-""", unsafe_allow_html=True)
+""")
 
 # Title
 st.title("🧠 Emotional Support Agent")
 
+# Load the model once per process and keep it pinned
+model_warmer = ensure_warm(MODEL_NAME)
+warmup_notice(model_warmer)
+debug_panel()
+
 # Display chat history in card format
-for msg in st.session_state['conversation_history']:
+def render_message(msg):
     with st.chat_message(msg["role"]):
         st.write(msg["content"])
         st.markdown("<div style='height: 10px;'></div>", unsafe_allow_html=True)  # Add spacing for scrolling
 
+render_history(st.session_state['conversation_history'], render_message)
+
+def submit_message():
+    # Take the message out of the text box, so later reruns don't send it again
+    st.session_state.pending_message = st.session_state.user_input
+    st.session_state.user_input = ""
+
 # User input section in a card
 with st.container():
     st.markdown("<div class='card'>", unsafe_allow_html=True)
-    user_message = st.text_input("Hey What's up!", key="user_input", placeholder="Type your message...")
+    st.text_input("Hey What's up!", key="user_input", placeholder="Type your message...", on_change=submit_message)
+    user_message = st.session_state.pop("pending_message", "")
     if user_message:
         with st.spinner("Thinking..."):
-            ai_response = generate_response(user_message)
+            turn = start_turn("theOG")  # Traces every stage of this turn
+            ai_response = generate_response(MODEL_NAME, user_message)
+            turn.finish()
             with st.chat_message("assistant"):
                 st.write(ai_response)
-        
-        # No need to clear the session state here; the input field will automatically clear after submission
     st.markdown("</div>", unsafe_allow_html=True)
 
 # Interactive features in card format
-with st.container():
-    st.markdown("<div class='card'>", unsafe_allow_html=True)
-    with st.expander("💬 Need Encouragement?"):
-        if st.button("Give me a Positive Affirmation"):
-            affirmation = ollama.chat(model=MODEL_NAME, messages=[{"role": "user", "content": "Give me a positive affirmation."}])
-            st.markdown(f"**AI**: {affirmation['message']['content']}")
-    st.markdown("</div>", unsafe_allow_html=True)
+@st.fragment
+def feature_card(title, label, prompt):
+    # A click redraws just this card, not the chat history
+    with st.container():
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        with st.expander(title):
+            if st.button(label):
+                st.markdown(f"**AI**: {response_pool.take(prompt)}")
+        st.markdown("</div>", unsafe_allow_html=True)
 
-with st.container():
-    st.markdown("<div class='card'>", unsafe_allow_html=True)
-    with st.expander("🧘 Try a Relaxing Meditation:"):
-        if st.button("Give me a Guided Meditation"):
-            meditation = ollama.chat(model=MODEL_NAME, messages=[{"role": "user", "content": "Give me a guided meditation."}])
-            st.markdown(f"**AI**: {meditation['message']['content']}")
-    st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file
+feature_card("💬 Need Encouragement?", "Give me a Positive Affirmation", AFFIRMATION_PROMPT)
+feature_card("🧘 Try a Relaxing Meditation:", "Give me a Guided Meditation", MEDITATION_PROMPT)
\ No newline at end of file